@@ -2,9 +2,12 @@ import os
 import sys
 import random
 import json
+import time
 
 # إضافة المسار
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# الـ engines المشتركة (http_engine, tts_engine, ...) من scripts/ بتاع الريبو؛ نسخ الـ tree ده ليها الأولوية
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts"))
 
 from content_engine import generate_script
 from media_engine import gather_media, download_video, get_thumbnail_image
@@ -12,18 +15,32 @@ from voice_engine import generate_voice
 from editor_engine import create_video, create_thumbnail
 from uploader_engine import upload_video
 
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "config", "animals_list.json")
+# ملف لوحده: scripts/scheduler_engine بيكتب subject_history.json بشكل تاني (recent + plans)
+HISTORY_PATH = "assets/cache/autoanimals_history.json"
+STRATEGY_WEIGHTS = {"focus_cute_first": {"cute": 3.0}}
+RECENT_BLOCK = 10  # أو تلت الكتالوج لو أصغر
+
 def get_random_animal():
-    # القائمة العملاقة مدمجة هنا لمنع الأخطاء
-    animals = [
-        "Jaguar", "Polar Bear", "Komodo Dragon", "Great White Shark", "Saltwater Crocodile", 
-        "Gray Wolf", "Cheetah", "Grizzly Bear", "Red Panda", "Quokka", "Sea Otter", 
-        "Capybara", "Fennec Fox", "Koala", "Sloth", "Meerkat", "Emperor Penguin", 
-        "Blue Whale", "Mantis Shrimp", "Orca", "Hammerhead Shark", "Shoebill Stork", 
-        "Peregrine Falcon", "Snowy Owl", "Eagle", "Toucan", "Praying Mantis", 
-        "Hercules Beetle", "Platypus", "Axolotl", "Pangolin", "Honey Badger",
-        "Narwhal", "Box Jellyfish", "Cassowary"
-    ]
-    selected = random.choice(animals)
+    # الحيوانات من config/animals_list.json، بوزن الاستراتيجية ومن غير تكرار للي اتعرضوا قريب
+    with open(CATALOG_PATH) as f:
+        catalog = json.load(f)
+    weights = STRATEGY_WEIGHTS.get(catalog.get("strategy"), {})
+    try:
+        with open(HISTORY_PATH) as f:
+            history = json.load(f)
+    except (OSError, ValueError):
+        history = {"recent": []}
+    animals = [(a, weights.get(cat, 1.0)) for cat, names in catalog["categories"].items() for a in names]
+    block = max(1, min(RECENT_BLOCK, len(animals) // 3))
+    recent = [r["animal"] for r in history.get("recent", [])][-block:]
+    fresh = [(a, w) for a, w in animals if a not in recent] or animals
+    selected = random.choices([a for a, _ in fresh], weights=[w for _, w in fresh])[0]
+
+    history.setdefault("recent", []).append({"animal": selected, "at": time.time()})
+    os.makedirs(os.path.dirname(HISTORY_PATH), exist_ok=True)
+    with open(HISTORY_PATH, "w") as f:
+        json.dump(history, f)
     print(f"🎲 System Selected: {selected}")
     return selected
 
@@ -1,23 +1,42 @@
 
 import os
-import requests
 import random
+from concurrent.futures import ThreadPoolExecutor
+
+import http_engine
+
+# settings.json: "resolution": "1080p"
+TARGET_W, TARGET_H = 1920, 1080
+
+def pick_rendition(files, target_w=TARGET_W, target_h=TARGET_H):
+    """Smallest mp4 that still covers the output size (largest if none does)."""
+    usable = [f for f in files if f.get('width') and f.get('height') and f.get('file_type', 'video/mp4') == 'video/mp4']
+    if not usable:
+        return None
+    covering = [f for f in usable if f['width'] >= target_w and f['height'] >= target_h]
+    area = lambda f: f['width'] * f['height']
+    return min(covering, key=area) if covering else max(usable, key=area)
+
+SEARCH_TIMEOUT = (10, 20)
 
 def search_pexels(query, api_key, per_page=5):
     headers = {'Authorization': api_key}
-    url = f"https://api.pexels.com/videos/search?query={query}&per_page={per_page}&orientation=landscape"
+    url = "https://api.pexels.com/videos/search"
+    params = {"query": query, "per_page": per_page, "orientation": "landscape"}
     try:
-        r = requests.get(url, headers=headers)
+        r = http_engine.get(url, headers=headers, params=params, timeout=SEARCH_TIMEOUT)
         if r.status_code == 200:
-            return [v['video_files'][0]['link'] for v in r.json()['videos'] if v['video_files']]
+            picks = [pick_rendition(v['video_files']) for v in r.json()['videos']]
+            return [f['link'] for f in picks if f]
     except:
         return []
     return []
 
 def search_pixabay(query, api_key):
-    url = f"https://pixabay.com/api/videos/?key={api_key}&q={query}&per_page=5"
+    url = "https://pixabay.com/api/videos/"
+    params = {"key": api_key, "q": query, "per_page": 5}
     try:
-        r = requests.get(url)
+        r = http_engine.get(url, params=params, timeout=SEARCH_TIMEOUT)
         if r.status_code == 200:
             return [v['videos']['large']['url'] for v in r.json()['hits']]
     except:
@@ -30,15 +49,21 @@ def gather_media(animal_name):
     pexels_key = os.environ.get("PEXELS_API_KEY")
     pixabay_key = os.environ.get("PIXABAY_API_KEY")
     
+    # الاتنين في نفس الوقت بدل ما نستنى Pexels يفشل الأول
+    jobs = []
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        if pexels_key:
+            jobs.append(pool.submit(search_pexels, animal_name, pexels_key))
+        if pixabay_key:
+            jobs.append(pool.submit(search_pixabay, animal_name, pixabay_key))
+        results = [j.result() for j in jobs]
+
+    # نخلطهم بالدور ونشيل المكرر
     videos = []
-    
-    # 1. Try Pexels
-    if pexels_key:
-        videos += search_pexels(animal_name, pexels_key)
-        
-    # 2. Try Pixabay (Fallback/Addition)
-    if pixabay_key and len(videos) < 3:
-        videos += search_pixabay(animal_name, pixabay_key)
+    for rank in range(max((len(r) for r in results), default=0)):
+        for r in results:
+            if rank < len(r) and r[rank] not in videos:
+                videos.append(r[rank])
     
     # Fallback: General animal query if specific fails
     if not videos:
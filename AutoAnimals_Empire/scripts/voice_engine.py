@@ -1,47 +1,83 @@
-
 import os
-import requests
-from openai import OpenAI
+import json
+import asyncio
+import hashlib
+import shutil
 
-def generate_voice(text, output_path="assets/temp/voice.mp3"):
-    print("🎙️ Generating Voiceover...")
-    
-    eleven_key = os.environ.get("ELEVENLABS_API_KEY")
-    openai_key = os.environ.get("OPENAI_API_KEY")
-    
-    # 1. Try ElevenLabs (Best Quality)
-    if eleven_key:
-        try:
-            # Adam Voice ID (Popular viral voice)
-            voice_id = "pNInz6obpgDQGcFmaJgB" 
-            url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-            headers = {"xi-api-key": eleven_key, "Content-Type": "application/json"}
-            data = {
-                "text": text,
-                "model_id": "eleven_monolingual_v1",
-                "voice_settings": {"stability": 0.5, "similarity_boost": 0.75}
-            }
-            r = requests.post(url, json=data, headers=headers)
-            if r.status_code == 200:
-                with open(output_path, 'wb') as f: f.write(r.content)
-                print("✅ Voice generated (ElevenLabs)")
-                return output_path
-        except Exception as e:
-            print(f"⚠️ ElevenLabs Failed: {e}")
+import tts_engine
+
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", "assets/cache/tts")
+MAX_CONCURRENCY = 4
+# ElevenLabs (أحسن جودة) الأول لو متساويين، وبعده OpenAI (Adam / onyx في tts_engine)
+PROVIDERS = ["elevenlabs", "openai"]
+
+def split_script(text):
+    """Split at '...' pauses so chunks can be synthesized (and cached) separately."""
+    parts = [p.strip() for p in text.split("...")]
+    chunks = [p + " ..." for p in parts[:-1] if p] + ([parts[-1]] if parts[-1] else [])
+    return chunks or [text]
+
+def _cache_path(text, provider):
+    voice = tts_engine.PROVIDERS[provider][1]
+    key = hashlib.sha256(f"{provider}|{voice}|+0%|{text}".encode()).hexdigest()
+    return os.path.join(TTS_CACHE_DIR, key + ".mp3")
 
-    # 2. Fallback to OpenAI TTS
-    if openai_key:
+def _usable():
+    return [p for p in PROVIDERS if os.environ.get(tts_engine.PROVIDERS[p][2])]
+
+async def _synthesize_chunk(text, semaphore, providers):
+    """One chunk: cache hit, else tts_engine (fastest healthy provider, hedged, with
+    failover and a timeout per attempt). Returns (provider, path) or None."""
+    for name in providers:
+        path = _cache_path(text, name)
+        if os.path.exists(path):
+            return name, path
+    async with semaphore:
         try:
-            client = OpenAI(api_key=openai_key)
-            response = client.audio.speech.create(
-                model="tts-1",
-                voice="onyx", # Deep male voice
-                input=text
-            )
-            response.stream_to_file(output_path)
-            print("✅ Voice generated (OpenAI Fallback)")
-            return output_path
+            name, tmp, timing = await tts_engine.synthesize(text, lambda n: _cache_path(text, n),
+                                                            tts_engine.ranked(providers))
         except Exception as e:
-            print(f"❌ OpenAI TTS Failed: {e}")
-            
-    return None
+            print(f"⚠️ TTS chunk failed: {e}")
+            return None
+    path = _cache_path(text, name)
+    with open(os.path.splitext(path)[0] + ".json", "w") as f:
+        json.dump(timing, f)
+    os.replace(tmp, path)
+    return name, path
+
+async def _generate_async(chunks, providers):
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    results = await asyncio.gather(*(_synthesize_chunk(c, semaphore, providers) for c in chunks))
+    voiced = [r for r in results if r]
+    if voiced and len({name for name, _ in voiced}) > 1:
+        # hedge/failover غيّر الصوت في النص: نعيد الباقي بصوت الأغلبية
+        voice = tts_engine.majority([name for name, _ in voiced], providers)
+        for i, result in enumerate(results):
+            if result and result[0] != voice:
+                results[i] = await _synthesize_chunk(chunks[i], semaphore, [voice]) or result
+    tts_engine.save_stats()
+    return [r[1] if r else None for r in results]
+
+def generate_voice(text, output_path="assets/temp/voice.mp3"):
+    print("🎙️ Generating Voiceover...")
+    os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    providers = _usable()
+    if not providers:
+        print("❌ No TTS API key (ELEVENLABS_API_KEY / OPENAI_API_KEY)")
+        return None
+    chunks = split_script(text)
+    paths = asyncio.run(_generate_async(chunks, providers))
+
+    if not all(paths):
+        print("❌ TTS Failed for some chunks")
+        return None
+
+    # MP3 frames تتلزق ورا بعض من غير re-encode
+    with open(output_path, 'wb') as out:
+        for p in paths:
+            with open(p, 'rb') as f:
+                shutil.copyfileobj(f, out)
+    print(f"✅ Voice generated ({len(chunks)} chunks)")
+    return output_path
@@ -0,0 +1,233 @@
+"""Offline benchmark for startup, the editing/thumbnail stages and the full execute_run.
+
+Everything runs on synthetic fixtures made with ffmpeg (colour bars, test
+patterns and noise at several sizes, plus a tone standing in for the
+voice), and the network engines are replaced with local stand-ins, so no
+Pexels, Wikipedia, TTS or YouTube credentials are needed. Every case gets
+its own empty caches, job queue and subject history under assets/bench/state.
+
+    python benchmarks/bench_pipeline.py --voice-seconds 60 --engine auto
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "scripts"))
+
+import metrics_engine
+
+FIXTURES = os.path.join(ROOT, "assets", "bench")
+# كاشات ومخازن الـ pipeline لكل case بتتعمل من الأول هنا بدل assets/cache بتاع الإنتاج
+STATE_DIR = os.path.join(FIXTURES, "state")
+STATE_PATHS = {
+    "MEDIA_CACHE_DIR": "media",
+    "PROBE_DB_PATH": "probe.sqlite3",
+    "JOBS_DB_PATH": "jobs.sqlite3",
+    "JOBS_DIR": "jobs",
+    "SUBJECT_HISTORY_PATH": "subject_history.json",
+    "UPLOAD_SESSIONS_PATH": "upload_sessions.json",
+    "HTTP_CACHE_DIR": "http",
+    "SEARCH_CACHE_DIR": "search",
+    "TTS_CACHE_DIR": "tts",
+    "TTS_STATS_PATH": "tts_stats.json",
+    "FACTS_DB_PATH": "facts.sqlite3",
+}
+
+# (name, lavfi source, width, height)
+CLIP_SPECS = [
+    ("bars_1080p", "smptehdbars", 1920, 1080),
+    ("pattern_720p", "testsrc2", 1280, 720),
+    ("noise_4k", "noise", 3840, 2160),
+    ("bars_portrait", "smptehdbars", 1080, 1920),
+    ("pattern_portrait", "testsrc2", 720, 1280),
+    ("noise_square", "noise", 1080, 1080),
+]
+
+def _ffmpeg(*args):
+    subprocess.run(["ffmpeg", "-y", "-hide_banner", "-loglevel", "error", *args], check=True)
+
+def _source(kind, width, height, seconds):
+    if kind == "noise":
+        return f"color=c=gray:s={width}x{height}:d={seconds},noise=alls=60:allf=t"
+    return f"{kind}=s={width}x{height}:d={seconds}"
+
+def make_clips(seconds=8, fps=25):
+    os.makedirs(FIXTURES, exist_ok=True)
+    paths = []
+    for name, kind, width, height in CLIP_SPECS:
+        path = os.path.join(FIXTURES, f"{name}_{seconds}s.mp4")
+        if not os.path.exists(path):
+            _ffmpeg("-f", "lavfi", "-i", _source(kind, width, height, seconds), "-r", str(fps),
+                    "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", path)
+        paths.append(path)
+    return paths
+
+def make_voice(seconds):
+    path = os.path.join(FIXTURES, f"voice_{seconds}s.mp3")
+    if not os.path.exists(path):
+        os.makedirs(FIXTURES, exist_ok=True)
+        _ffmpeg("-f", "lavfi", "-i", f"sine=frequency=220:duration={seconds}", "-c:a", "libmp3lame", path)
+    return path
+
+def make_image():
+    path = os.path.join(FIXTURES, "thumb_bg.jpg")
+    if not os.path.exists(path):
+        os.makedirs(FIXTURES, exist_ok=True)
+        _ffmpeg("-f", "lavfi", "-i", "testsrc2=s=1880x1253", "-frames:v", "1", path)
+    return path
+
+def isolate_state():
+    """Point every cache and store at an empty STATE_DIR, so no case reuses another's
+    normalized clips and no run touches the production job queue or history.
+    Must run before the pipeline engines are imported (they read these at import)."""
+    shutil.rmtree(STATE_DIR, ignore_errors=True)
+    os.makedirs(STATE_DIR)
+    for var, name in STATE_PATHS.items():
+        os.environ[var] = os.path.join(STATE_DIR, name)
+
+def install_offline_stubs(main_pipeline, voice_seconds):
+    """Swap every network-facing engine used by execute_run for a local stand-in."""
+    clips = make_clips()
+
+    def search_videos(query, orientation="portrait", limit=5):
+        portrait = orientation == "portrait"
+        chosen = [p for p, spec in zip(clips, CLIP_SPECS) if (spec[3] > spec[2]) == portrait] or clips
+        return [{"id": i, "link": p, "width": 0, "height": 0, "duration": 8, "key": None}
+                for i, p in enumerate((chosen * limit)[:limit])]
+
+    def download_videos(urls, out_dir="assets/temp", workers=4, keys=None, trims=None):
+        os.makedirs(out_dir, exist_ok=True)
+        for i, url in enumerate(urls):
+            dest = os.path.join(out_dir, f"clip_{i}.mp4")
+            shutil.copyfile(url, dest)
+            yield i, dest
+
+    def generate_script(animal_name, mode="short"):
+        return {"title": f"{animal_name} (offline)", "description": "benchmark",
+                "script_text": "offline " * 20, "tags": ["bench"]}
+
+    def expected_script(animal_name, mode="short", offline=False):
+        return generate_script(animal_name, mode)["script_text"]
+
+    def generate_voice(text, output_path="assets/temp/voice.mp3"):
+        return make_voice(voice_seconds)
+
+    def pick_subject(mode, exclude=(), rng=None, record=True):
+        return "Koala"
+
+    def get_thumbnail_image(query, output_path="assets/temp/thumb_bg.jpg"):
+        return make_image()
+
+    def upload_video(file_path, title, description, tags=[], thumbnail_path=None):
+        return f"offline-{os.path.getsize(file_path)}"
+
+    main_pipeline.pick_subject = pick_subject
+    main_pipeline.search_videos = search_videos
+    main_pipeline.download_videos = download_videos
+    main_pipeline.generate_script = generate_script
+    main_pipeline.expected_script = expected_script
+    main_pipeline.generate_voice = generate_voice
+    main_pipeline.get_thumbnail_image = get_thumbnail_image
+    main_pipeline.upload_video = upload_video
+
+CASES = ["startup", "edit_short", "edit_long", "thumbnail", "e2e_short", "e2e_long"]
+# لو أي واحد منهم اتحمل في الـ startup أو --plan يبقى فيه import رجع eager
+HEAVY_MODULES = ("moviepy", "googleapiclient", "edge_tts", "wikipedia")
+
+def run_startup(voice_seconds):
+    """Import time of main_pipeline plus an offline --plan, with the heavy stacks left unloaded."""
+    import time
+    t0 = time.perf_counter()
+    import main_pipeline
+    import_s = time.perf_counter() - t0
+    install_offline_stubs(main_pipeline, voice_seconds)
+    main_pipeline.plan_run("short", animal="Koala")
+    wall_s = time.perf_counter() - t0
+    heavy = [m for m in HEAVY_MODULES if m in sys.modules]
+    return {"stage": "startup", "status": "failed" if heavy else "ok", "wall_s": round(wall_s, 3),
+            "import_s": round(import_s, 3), "heavy_loaded": heavy}
+
+def run_case(case, voice_seconds, engine):
+    """Run one case in this process and return its metrics record."""
+    isolate_state()
+    if case == "startup":
+        return run_startup(voice_seconds)
+    import editor_engine
+    import main_pipeline
+
+    metrics_engine.REPORT_PATH = os.path.join(FIXTURES, "bench_report.jsonl")
+    out_dir = os.path.join(FIXTURES, "out")
+    kind, mode = case.split("_", 1) if "_" in case else (case, None)
+
+    if kind == "edit":
+        clips, voice = make_clips(), make_voice(voice_seconds)
+        fn = lambda: editor_engine.create_video(
+            clips, voice, None, mode=mode, output_path=os.path.join(out_dir, f"{mode}.mp4"), engine=engine)
+    elif kind == "thumbnail":
+        image = make_image()
+        fn = lambda: editor_engine.create_thumbnail(image, "BENCH FACTS", output_path=os.path.join(out_dir, "thumb.jpg"))
+    else:
+        # execute_run بيعمل الـ run report بنفسه، فبناخد آخر سطر منه
+        install_offline_stubs(main_pipeline, voice_seconds)
+        editor_engine.RENDER_ENGINE = engine
+        main_pipeline.execute_run(mode)
+        with open(metrics_engine.REPORT_PATH) as f:
+            run = json.loads(f.readlines()[-1])
+        frames = sum(s["frames_rendered"] for s in run["stages"])
+        return {"stage": case, "status": run["status"], "wall_s": run["total_wall_s"],
+                "peak_rss_mb": run["peak_rss_mb"], "frames_rendered": frames,
+                "fps_rendered": round(frames / run["total_wall_s"], 1) if run["total_wall_s"] else 0}
+
+    metrics_engine.start_run(case)
+    with metrics_engine.stage(case):
+        ok = bool(fn())
+    run = metrics_engine.finish_run("ok" if ok else "failed")
+    record = run["stages"][0]
+    record["fps_rendered"] = round(record["frames_rendered"] / record["wall_s"], 1) if record["wall_s"] else 0
+    return record
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--voice-seconds", type=int, default=30, help="length of the synthetic narration")
+    parser.add_argument("--engine", default="auto", choices=["auto", "ffmpeg", "streaming", "moviepy"])
+    parser.add_argument("--case", choices=CASES, help="run a single case in this process")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    if not shutil.which("ffmpeg"):
+        sys.exit("ffmpeg is needed to build the synthetic fixtures")
+
+    if args.case:
+        print("BENCH_RESULT " + json.dumps(run_case(args.case, args.voice_seconds, args.engine)))
+        return
+
+    # كل case في process لوحده عشان peak RSS يبقى بتاعها هي بس
+    make_clips(); make_voice(args.voice_seconds); make_image()
+    results = []
+    for case in CASES:
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--case", case,
+                              "--voice-seconds", str(args.voice_seconds), "--engine", args.engine],
+                             capture_output=True, text=True, cwd=ROOT)
+        line = next((l for l in out.stdout.splitlines() if l.startswith("BENCH_RESULT ")), None)
+        if line:
+            results.append(json.loads(line[len("BENCH_RESULT "):]))
+        else:
+            print(f"❌ {case} crashed:\n{out.stderr[-2000:]}")
+            results.append({"stage": case, "status": "crashed", "wall_s": 0})
+
+    print(f"\n🏁 BENCHMARK ({args.engine}, {args.voice_seconds}s voice)")
+    print(f"{'case':<14}{'wall s':>9}{'fps':>9}{'rss MB':>9}  status")
+    for r in results:
+        print(f"{r['stage']:<14}{r['wall_s']:>9.2f}{r.get('fps_rendered', 0):>9.1f}"
+              f"{r.get('peak_rss_mb', 0):>9.1f}  {r['status']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+import wave
+import subprocess
+
+import numpy as np
+
+import cache_engine
+import ffmpeg_engine
+
+# الموسيقى بتتفك مرة واحدة لـ PCM، والمكس كله NumPy بدل CompositeAudioClip
+SAMPLE_RATE = 44100
+CHANNELS = 2
+MUSIC_GAIN = 0.15
+DUCK_DEPTH = 0.6        # قد إيه الموسيقى بتوطى تحت الصوت (0 = مفيش ducking)
+ENVELOPE_HOP = 0.01     # 10ms
+ENVELOPE_SMOOTH = 0.25  # attack/release تقريبي بالثواني
+
+def decode_pcm(path, sample_rate=SAMPLE_RATE, channels=CHANNELS):
+    """Decode any audio file to an int16 array of shape (samples, channels) with ffmpeg."""
+    out = subprocess.run(
+        [ffmpeg_engine.ffmpeg_bin(), "-hide_banner", "-loglevel", "error", "-i", path,
+         "-f", "s16le", "-acodec", "pcm_s16le", "-ac", str(channels), "-ar", str(sample_rate), "-"],
+        capture_output=True, check=True).stdout
+    return np.frombuffer(out, dtype=np.int16).reshape(-1, channels)
+
+def load_music(music_path):
+    """Background track as a memory-mapped PCM array, decoded once and kept in the media cache."""
+    key = f"pcm_{cache_engine.file_fingerprint(music_path)}_{SAMPLE_RATE}"
+    cached = cache_engine.lookup(key, ".npy")
+    if cached:
+        return np.load(cached, mmap_mode="r")
+    pcm = decode_pcm(music_path)
+    path = cache_engine.cache_path(key, ".npy")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, pcm)
+    os.replace(tmp, path)
+    return np.load(path, mmap_mode="r")
+
+def loop_to(pcm, n_samples):
+    """Repeat (or cut) a track to exactly n_samples."""
+    if len(pcm) == 0:
+        return np.zeros((n_samples, CHANNELS), dtype=np.float32)
+    reps = -(-n_samples // len(pcm))
+    return np.tile(np.asarray(pcm, dtype=np.float32), (reps, 1))[:n_samples]
+
+def duck_curve(voice, n_samples, gain=MUSIC_GAIN, depth=DUCK_DEPTH):
+    """Per-sample music gain: gain where the voice is silent, gain*(1-depth) under speech."""
+    hop = int(SAMPLE_RATE * ENVELOPE_HOP)
+    mono = np.abs(voice.astype(np.float32).mean(axis=1))
+    frames = len(mono) // hop
+    if frames == 0:
+        return np.full(n_samples, gain, dtype=np.float32)
+    rms = np.sqrt((mono[:frames * hop].reshape(frames, hop) ** 2).mean(axis=1))
+    env = rms / (rms.max() or 1.0)
+    width = max(1, int(ENVELOPE_SMOOTH / ENVELOPE_HOP))
+    env = np.convolve(env, np.ones(width, dtype=np.float32) / width, mode="same")
+    env = np.clip(env * 4, 0, 1)  # أي كلام واضح = ducking كامل
+    curve = gain * (1.0 - depth * env)
+    curve = np.repeat(curve, hop)
+    if len(curve) < n_samples:
+        curve = np.concatenate([curve, np.full(n_samples - len(curve), gain, dtype=np.float32)])
+    return curve[:n_samples].astype(np.float32)
+
+def write_wav(path, pcm):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with wave.open(path, "wb") as w:
+        w.setnchannels(CHANNELS)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(np.ascontiguousarray(pcm, dtype=np.int16).tobytes())
+    return path
+
+def premix(voice_path, music_path, duration, output_path, gain=MUSIC_GAIN, depth=DUCK_DEPTH):
+    """Voice + looped, ducked background music as one WAV of exactly duration seconds.
+
+    The renderer then only has to encode a single audio stream.
+    """
+    if not ffmpeg_engine.ffmpeg_bin():
+        return None
+    n = int(duration * SAMPLE_RATE)
+    voice = decode_pcm(voice_path)[:n]
+    music = loop_to(load_music(music_path), n)
+    mix = music * duck_curve(voice, n, gain, depth)[:, None]
+    mix[:len(voice)] += voice
+    return write_wav(output_path, np.clip(mix, -32768, 32767).astype(np.int16))
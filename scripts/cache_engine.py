@@ -0,0 +1,113 @@
+import os
+import json
+import hashlib
+import shutil
+import tempfile
+import threading
+
+# كاش دائم للفيديوهات والصور، بيتشارك بين الشورتس والطويل وبين الرنات
+CACHE_DIR = os.environ.get("MEDIA_CACHE_DIR", "assets/cache/media")
+MAX_CACHE_BYTES = int(os.environ.get("MEDIA_CACHE_MAX_MB", "2048")) * 1024 * 1024
+
+_ALIASES = "aliases.json"
+_lock = threading.Lock()
+
+def media_key(provider, kind, media_id, rendition):
+    """Content key for one rendition of a stock asset, e.g. pexels_video_123_1280x720."""
+    return f"{provider}_{kind}_{media_id}_{rendition}"
+
+def cache_path(key, ext=".mp4"):
+    return os.path.join(CACHE_DIR, f"{key}{ext}")
+
+def file_fingerprint(path, sample=1024 * 1024):
+    """Cheap content id for a local file: size + sha1 of its first and last MB."""
+    size = os.path.getsize(path)
+    h = hashlib.sha1(str(size).encode())
+    with open(path, 'rb') as f:
+        h.update(f.read(sample))
+        if size > sample:
+            f.seek(max(sample, size - sample))
+            h.update(f.read(sample))
+    return h.hexdigest()[:20]
+
+def lookup(key, ext=".mp4"):
+    """Return the cached file for key (and mark it recently used), or None."""
+    path = cache_path(key, ext)
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        try:
+            os.utime(path, None)  # LRU: mtime = last use
+        except OSError:
+            pass
+        return path
+    return None
+
+def atomic_write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+    return path
+
+def link_into(cached, dest):
+    """Expose a cached file at dest. Hard links survive eviction of the cache entry."""
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    if os.path.exists(dest):
+        os.remove(dest)
+    try:
+        os.link(cached, dest)
+    except OSError:
+        shutil.copyfile(cached, dest)
+    return dest
+
+def resolve_alias(name):
+    """Map a lookup name (e.g. a search query) to a cache key without network."""
+    try:
+        with open(os.path.join(CACHE_DIR, _ALIASES)) as f:
+            return json.load(f).get(name)
+    except Exception:
+        return None
+
+def set_alias(name, key):
+    with _lock:
+        path = os.path.join(CACHE_DIR, _ALIASES)
+        try:
+            with open(path) as f:
+                aliases = json.load(f)
+        except Exception:
+            aliases = {}
+        aliases[name] = key
+        atomic_write(path, json.dumps(aliases, indent=2).encode())
+
+def evict(max_bytes=MAX_CACHE_BYTES):
+    """Delete least recently used entries until the cache fits in max_bytes."""
+    with _lock:
+        if not os.path.isdir(CACHE_DIR):
+            return 0
+        entries = []
+        for name in os.listdir(CACHE_DIR):
+            if name == _ALIASES or name.endswith((".tmp", ".part")):
+                continue
+            path = os.path.join(CACHE_DIR, name)
+            if os.path.isfile(path):
+                st = os.stat(path)
+                entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        if removed:
+            print(f"🧹 Cache: evicted {removed} old files")
+        return removed
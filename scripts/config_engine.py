@@ -0,0 +1,46 @@
+import os
+import json
+
+# config/settings.json في روت المشروع
+SETTINGS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "settings.json")
+
+_settings = None
+
+def load_settings():
+    global _settings
+    if _settings is None:
+        try:
+            with open(SETTINGS_PATH, encoding="utf-8") as f:
+                _settings = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Settings not loaded ({e}), using defaults")
+            _settings = {}
+    return _settings
+
+def get_render_profile(mode):
+    """Merged render settings for a mode: render.default overlaid with render.<mode>.
+
+    threads=0 means one per CPU core; segment_workers=0 means pick from the core count.
+    """
+    render = load_settings().get("render", {})
+    profile = {
+        "fps": 24,
+        "preset": "ultrafast",
+        "crf": 23,
+        "threads": 0,
+        "segment_parallel": False,
+        "normalize_cache": True,
+        "segment_workers": 0,
+        "target_seconds_per_minute": 60,
+        "streaming": True,
+        "memory_budget_mb": 1536,
+    }
+    profile.update(render.get("default", {}))
+    profile.update(render.get(mode, {}))
+
+    cores = os.cpu_count() or 1
+    if not profile["threads"]:
+        profile["threads"] = cores
+    if not profile["segment_workers"]:
+        profile["segment_workers"] = max(1, min(4, cores // 2))
+    return profile
@@ -1,56 +1,20 @@
 import random
-import wikipedia
-import re
 
-def get_detailed_facts(animal):
-    print(f"📚 Reading Full Wikipedia Page for: {animal}...")
-    try:
-        wikipedia.set_lang("en")
-        # هات الصفحة كاملة مش الملخص
-        try:
-            page = wikipedia.page(animal, auto_suggest=False)
-        except wikipedia.exceptions.DisambiguationError as e:
-            page = wikipedia.page(e.options[0], auto_suggest=False)
-        except:
-            return []
+import facts_engine
 
-        content = page.content
-        # تنظيف النص
-        content = re.sub(r'==.*?==+', '', content) # شيل العناوين
-        content = re.sub(r'\n', ' ', content)      # شيل السطور الفاضية
-        content = re.sub(r'\[.*?\]', '', content)  # شيل المصادر [1]
-        
-        # قسم النص لجمل طويلة
-        sentences = content.split('. ')
-        long_facts = []
-        
-        current_fact = ""
-        for s in sentences:
-            current_fact += s + ". "
-            # الحقيقة الواحدة لازم تكون دسمة (أكتر من 150 حرف)
-            if len(current_fact) > 150: 
-                long_facts.append(current_fact.strip())
-                current_fact = ""
-                if len(long_facts) >= 10: break # كفاية 10 فقرات دسمة
-        
-        return long_facts
+def get_detailed_facts(animal, offline=False):
+    # الحقائق جاية من المخزن المحلي (facts_engine)، ويكيبيديا بس لو الصفحة اتغيرت
+    try:
+        return facts_engine.get_facts(animal, offline=offline)
     except Exception as e:
         print(f"⚠️ Wikipedia Error: {e}")
         return []
 
-def generate_script(animal_name, mode="short"):
-    print(f"📝 Writing Script ({mode}) for: {animal_name}")
-    
-    hooks = [
-        f"Prepare to be amazed by the top 10 facts about the {animal_name}.",
-        f"Here is the ultimate guide to the {animal_name}. 10 things you didn't know.",
-        f"Why is the {animal_name} so unique? Let's discover 10 reasons."
-    ]
-    hook = random.choice(hooks)
-    
+def narration_body(animal_name, mode="short", offline=False):
+    """Everything the narration says after the (random) hook. The TTS cache is keyed
+    on these chunks, so the scheduler can tell how much of a video is already voiced."""
     if mode == "long":
-        # --- DOCUMENTARY (3+ Minutes Goal) ---
-        facts = get_detailed_facts(animal_name)
+        facts = get_detailed_facts(animal_name, offline)
         
         # لو فشل يجيب حقائق طويلة، نملى بكلام عام عشان الوقت
         if len(facts) < 5:
@@ -63,8 +27,37 @@ def generate_script(animal_name, mode="short"):
             script_body += "... " 
 
         outro = "Thank you for watching this documentary. Nature is truly fascinating. Which fact was your favorite? Tell us in the comments below. Don't forget to subscribe for more daily wildlife videos."
-        
-        script_text = f"{hook} ... {script_body} ... {outro}"
+        return f"{script_body} ... {outro}"
+
+    try:
+        summary = facts_engine.get_summary(animal_name, offline=offline) or f"{animal_name} is cool."
+    except: summary = f"{animal_name} is cool."
+    return f"Did you know this about the {animal_name}? {summary} Subscribe for more!"
+
+def _hooks(animal_name):
+    return [
+        f"Prepare to be amazed by the top 10 facts about the {animal_name}.",
+        f"Here is the ultimate guide to the {animal_name}. 10 things you didn't know.",
+        f"Why is the {animal_name} so unique? Let's discover 10 reasons."
+    ]
+
+def expected_script(animal_name, mode="short", offline=False):
+    """The script text to plan footage from before generate_script has run: same
+    body, longest hook (the real one is picked at random), so estimates never come up short."""
+    body = narration_body(animal_name, mode, offline)
+    if mode != "long":
+        return body
+    hook = max(_hooks(animal_name), key=lambda h: len(h.split()))
+    return f"{hook} ... {body}"
+
+def generate_script(animal_name, mode="short"):
+    print(f"📝 Writing Script ({mode}) for: {animal_name}")
+    
+    hook = random.choice(_hooks(animal_name))
+    
+    if mode == "long":
+        # --- DOCUMENTARY (3+ Minutes Goal) ---
+        script_text = f"{hook} ... {narration_body(animal_name, mode)}"
         
         title = f"10 Amazing Facts About The {animal_name} 🌍 (Full Documentary)"
         desc = f"Discover the secrets of the {animal_name} in this detailed documentary.\n\n#animals #wildlife #documentary #{animal_name.replace(' ', '')} #nature"
@@ -72,11 +65,7 @@ def generate_script(animal_name, mode="short"):
         
     else:
         # --- SHORTS (Fast & Snappy) ---
-        try:
-            summary = wikipedia.summary(animal_name, sentences=3)
-        except: summary = f"{animal_name} is cool."
-        
-        script_text = f"Did you know this about the {animal_name}? {summary} Subscribe for more!"
+        script_text = narration_body(animal_name, mode)
         title = f"{animal_name}: Mind Blowing Facts 🤯 #shorts"
         desc = f"Quick facts about {animal_name} #shorts"
         tags = ["shorts", "animals", "viral", animal_name]
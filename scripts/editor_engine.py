@@ -1,57 +1,97 @@
+import gc
 import os
+import math
 import sys
+import shutil
 import traceback
 
-# --- 🛠️ THE FIX: MONKEY PATCH FOR PILLOW 10+ ---
-import PIL.Image
-if not hasattr(PIL.Image, 'ANTIALIAS'):
-    PIL.Image.ANTIALIAS = PIL.Image.LANCZOS
-# -----------------------------------------------
+import audio_engine
+import config_engine
+import ffmpeg_engine
+import metrics_engine
+import probe_engine
+import thumbnail_engine
 
-from moviepy.editor import VideoFileClip, AudioFileClip, concatenate_videoclips, CompositeAudioClip
-from PIL import Image, ImageDraw, ImageFont
+def _moviepy():
+    """MoviePy is only needed by the fallback renders, so it (and the PIL patch) load on first use."""
+    # --- 🛠️ THE FIX: MONKEY PATCH FOR PILLOW 10+ ---
+    import PIL.Image
+    if not hasattr(PIL.Image, 'ANTIALIAS'):
+        PIL.Image.ANTIALIAS = PIL.Image.LANCZOS
+    # -----------------------------------------------
+    import moviepy.editor
+    return moviepy.editor
 
-# --- 1. دالة المونتاج (المعدلة للإصلاح) ---
-def create_video(video_paths, audio_path, music_path=None, mode="short", output_path="assets/final_video.mp4"):
+# --- 1. دالة المونتاج ---
+# engine: "auto" = ffmpeg لو موجود وبعدين MoviePy، أو "ffmpeg" / "streaming" / "moviepy" بالتحديد
+RENDER_ENGINE = os.environ.get("RENDER_ENGINE", "auto")
+
+def create_video(video_paths, audio_path, music_path=None, mode="short", output_path="assets/final_video.mp4", engine=None, timing=None):
+    engine = engine or RENDER_ENGINE
+    if mode not in ffmpeg_engine.TARGETS:
+        mode = ffmpeg_engine.detect_mode(video_paths) if ffmpeg_engine.available() else "short"
+    profile = config_engine.get_render_profile(mode)
+
+    # Audio Mix: الموسيقى بتتمكس مرة واحدة قبل الرندر (audio_engine)
+    if music_path and os.path.exists(music_path):
+        mixed, timing = _premix_audio(audio_path, music_path, timing, output_path)
+        if mixed:
+            audio_path, music_path = mixed, None
+
+    if engine in ("auto", "ffmpeg"):
+        try:
+            result = ffmpeg_engine.render(video_paths, audio_path, music_path, mode=mode,
+                                          output_path=output_path, profile=profile, timing=timing)
+        except Exception as e:
+            print(f"⚠️ ffmpeg render crashed: {e}")
+            result = None
+        if result or engine == "ffmpeg":
+            return result
+        print("↩️ Falling back to MoviePy render...")
+
+    if engine == "streaming" or (engine == "auto" and profile["streaming"]):
+        return _create_video_streaming(video_paths, audio_path, music_path, mode=mode,
+                                       output_path=output_path, profile=profile, timing=timing)
+    return _create_video_moviepy(video_paths, audio_path, music_path, mode=mode,
+                                 output_path=output_path, profile=profile, timing=timing)
+
+def _premix_audio(audio_path, music_path, timing, output_path):
+    """Voice + looped, ducked music as one WAV. Returns (path, timing) or (None, timing)."""
+    try:
+        voice_duration = timing["duration"] if timing else (ffmpeg_engine.probe(audio_path) or {}).get("duration")
+        if not voice_duration:
+            return None, timing
+        print("🎵 Pre-mixing Music...")
+        mixed = audio_engine.premix(audio_path, music_path, voice_duration + 1.0,
+                                    os.path.splitext(output_path)[0] + "_mix.wav")
+        # الـ WAV أطول ثانية من الصوت، فبنثبت المدة الحقيقية للرندر
+        return mixed, dict(timing or {}, duration=voice_duration)
+    except Exception as e:
+        print(f"⚠️ Music Pre-mix Error: {e}")
+        return None, timing
+
+# مسار MoviePy القديم (fallback)
+def _create_video_moviepy(video_paths, audio_path, music_path=None, mode="short", output_path="assets/final_video.mp4", profile=None, timing=None):
+    profile = profile or config_engine.get_render_profile(mode)
+    mpy = _moviepy()
     print(f"🎬 STARTING EDIT: Mode={mode} | Clips={len(video_paths)}")
+    clips, final_clip, final_audio, music, voice_audio = [], None, None, None, None
     
     try:
-        voice_audio = AudioFileClip(audio_path)
-        target_duration = voice_audio.duration + 1.0
+        voice_audio = mpy.AudioFileClip(audio_path)
+        target_duration = (timing["duration"] if timing else voice_audio.duration) + 1.0
         
-        clips = []
         current_duration = 0
         
-        # إعدادات الجودة
-        if mode == "long":
-            TARGET_W, TARGET_H = 1280, 720
-            print("ℹ️ Config: 720p HD (Optimized for Cloud)")
-        else:
-            TARGET_W, TARGET_H = 1080, 1920
-            print("ℹ️ Config: 1080p Shorts")
+        TARGET_W, TARGET_H = ffmpeg_engine.TARGETS[mode]
 
         for path in video_paths:
+            # الكليب البايظ بيتعرف من الفهرس من غير ما نفتح reader
+            if not probe_engine.is_valid(path):
+                print(f"⚠️ Skipped Bad Clip: {path}")
+                continue
             try:
-                clip = VideoFileClip(path)
-                
-                # Resize Logic (محمي بالباتش اللي فوق)
-                if mode == "long":
-                    # 1. Resize width
-                    if clip.w != TARGET_W: 
-                        clip = clip.resize(width=TARGET_W)
-                    # 2. Crop height
-                    if clip.h > TARGET_H:
-                        clip = clip.crop(x1=0, y1=clip.h/2 - TARGET_H/2, width=TARGET_W, height=TARGET_H)
-                    elif clip.h < TARGET_H:
-                        clip = clip.resize(height=TARGET_H)
-                        clip = clip.crop(x1=clip.w/2 - TARGET_W/2, y1=0, width=TARGET_W, height=TARGET_H)
-                
-                else: # Shorts
-                    if clip.h != TARGET_H: 
-                        clip = clip.resize(height=TARGET_H)
-                    if clip.w > TARGET_W:
-                        clip = clip.crop(x1=clip.w/2 - TARGET_W/2, y1=0, width=TARGET_W, height=TARGET_H)
-
+                clip = _fit_clip(mpy.VideoFileClip(path), TARGET_W, TARGET_H)
                 clips.append(clip)
                 current_duration += clip.duration
                 if current_duration >= target_duration: break
@@ -65,7 +105,7 @@ def create_video(video_paths, audio_path, music_path=None, mode="short", output_
             return None
 
         print(f"🧩 Concatenating {len(clips)} clips...")
-        final_clip = concatenate_videoclips(clips, method="compose")
+        final_clip = mpy.concatenate_videoclips(clips, method="compose")
         
         if final_clip.duration > target_duration:
             final_clip = final_clip.subclip(0, target_duration)
@@ -75,13 +115,13 @@ def create_video(video_paths, audio_path, music_path=None, mode="short", output_
         if music_path and os.path.exists(music_path):
             print("🎵 Mixing Music...")
             try:
-                music = AudioFileClip(music_path)
+                music = mpy.AudioFileClip(music_path)
                 if music.duration < target_duration:
                     music = music.loop(duration=target_duration)
                 else:
                     music = music.subclip(0, target_duration)
                 music = music.volumex(0.15)
-                final_audio = CompositeAudioClip([voice_audio, music])
+                final_audio = mpy.CompositeAudioClip([voice_audio, music])
             except Exception as e:
                 print(f"⚠️ Music Mix Error: {e}")
 
@@ -91,13 +131,15 @@ def create_video(video_paths, audio_path, music_path=None, mode="short", output_
         
         print("💾 Rendering to Disk...")
         final_clip.write_videofile(
-            output_path, 
-            fps=24, 
-            codec='libx264', 
-            audio_codec='aac', 
-            threads=1, 
-            preset='ultrafast'
+            output_path,
+            fps=profile['fps'],
+            codec='libx264',
+            audio_codec='aac',
+            threads=profile['threads'],
+            preset=profile['preset'],
+            ffmpeg_params=['-crf', str(profile['crf'])]
         )
+        metrics_engine.add_frames(int(final_clip.duration * profile['fps']))
         
         return output_path
 
@@ -105,23 +147,124 @@ def create_video(video_paths, audio_path, music_path=None, mode="short", output_
         print("\n❌ FATAL EDITING CRASH:")
         traceback.print_exc()
         return None
+    finally:
+        # كل VideoFileClip شايل ffmpeg reader process، لازم يتقفل
+        for c in [final_clip, final_audio, music, voice_audio] + clips:
+            if c is not None:
+                try:
+                    c.close()
+                except Exception:
+                    pass
+
+def _fit_clip(clip, TARGET_W, TARGET_H):
+    """Scale a clip to cover the mode's frame, then center-crop it to exactly TARGET_W x TARGET_H.
+
+    Every source (narrower than 9:16, wider than 16:9, odd sizes) comes out
+    the same size, which the streaming editor's stream-copy join relies on.
+    """
+    # Resize Logic (محمي بالباتش اللي فوق)؛ ceil عشان التقريب ميسيبش بكسل ناقص
+    scale = max(TARGET_W / clip.w, TARGET_H / clip.h)
+    new_w, new_h = max(TARGET_W, math.ceil(clip.w * scale)), max(TARGET_H, math.ceil(clip.h * scale))
+    if (new_w, new_h) != (clip.w, clip.h):
+        clip = clip.resize(newsize=(new_w, new_h))
+    if (clip.w, clip.h) != (TARGET_W, TARGET_H):
+        clip = clip.crop(x1=(clip.w - TARGET_W) // 2, y1=(clip.h - TARGET_H) // 2, width=TARGET_W, height=TARGET_H)
+    return clip
+
+def _check_memory(budget_mb):
+    """Stop before opening another decoder if the process tree is over budget."""
+    rss = metrics_engine.current_rss_mb()
+    if rss > budget_mb:
+        gc.collect()
+        rss = metrics_engine.current_rss_mb()
+    if rss > budget_mb:
+        raise MemoryError(f"render using {rss:.0f} MB, budget is {budget_mb} MB")
+    return rss
+
+# Streaming: كليب واحد مفتوح في المرة، بيترندر segment ويتقفل على طول
+def _create_video_streaming(video_paths, audio_path, music_path=None, mode="short", output_path="assets/final_video.mp4", profile=None, timing=None):
+    """Encode one segment per source with only that source's decoder open, then join
+    the segments with stream copy. Memory stays at roughly one clip regardless of count."""
+    profile = profile or config_engine.get_render_profile(mode)
+    mpy = _moviepy()
+    budget = profile["memory_budget_mb"]
+    print(f"🎬 STARTING STREAMING EDIT: Mode={mode} | Clips={len(video_paths)} | Budget={budget} MB")
+    TARGET_W, TARGET_H = ffmpeg_engine.TARGETS[mode]
+    # الـ reader بيصغر وهو بيفك، فالفريمات اللي في الذاكرة قد الـ output مش قد الـ 4K
+    read_size = (None, TARGET_W) if mode == "long" else (TARGET_H, None)
+    seg_dir = os.path.splitext(output_path)[0] + "_segments"
+    os.makedirs(seg_dir, exist_ok=True)
+
+    try:
+        if timing:
+            voice_duration = timing["duration"]
+        else:
+            voice_audio = mpy.AudioFileClip(audio_path)
+            voice_duration = voice_audio.duration
+            voice_audio.close()
+        target_duration = voice_duration + 1.0
+
+        segments, covered, high_water = [], 0.0, 0.0
+        for path in video_paths:
+            if covered >= target_duration:
+                break
+            info = probe_engine.clip_info(path)
+            if info is not None and not info["valid"]:
+                print(f"⚠️ Skipped Bad Clip: {path} ({info['error']})")
+                continue
+            high_water = max(high_water, _check_memory(budget))
+            clip = None
+            try:
+                clip = _fit_clip(mpy.VideoFileClip(path, audio=False, target_resolution=read_size),
+                                 TARGET_W, TARGET_H)
+                use = min(info["duration"] if info else clip.duration, clip.duration, target_duration - covered)
+                seg_path = os.path.join(seg_dir, f"seg_{len(segments):03d}.mp4")
+                clip.subclip(0, use).write_videofile(
+                    seg_path,
+                    fps=profile['fps'],
+                    codec='libx264',
+                    audio=False,
+                    threads=profile['threads'],
+                    preset=profile['preset'],
+                    ffmpeg_params=['-crf', str(profile['crf'])],
+                    logger=None
+                )
+                segments.append((seg_path, use))
+                covered += use
+                metrics_engine.add_frames(int(use * profile['fps']))
+            except MemoryError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Skipped Bad Clip: {e}")
+            finally:
+                if clip is not None:
+                    clip.close()
+            high_water = max(high_water, metrics_engine.current_rss_mb())
+
+        if not segments:
+            print("❌ ERROR: No valid clips processed!")
+            return None
+
+        print(f"🧩 Joining {len(segments)} segments...")
+        if not ffmpeg_engine.concat_segments(segments, audio_path, music_path, target_duration, output_path):
+            return None
+        print(f"📈 Streaming edit memory: {high_water:.0f} MB sampled, "
+              f"{metrics_engine.peak_rss_mb():.0f} MB peak RSS (budget {budget} MB)")
+        return output_path
+
+    except Exception as e:
+        print("\n❌ FATAL EDITING CRASH:")
+        traceback.print_exc()
+        return None
+    finally:
+        shutil.rmtree(seg_dir, ignore_errors=True)
 
 # --- 2. دالة الثامبنيل ---
 def create_thumbnail(image_path, text, output_path="assets/temp/final_thumb.jpg"):
     print("🖼️ Generating Thumbnail...")
     try:
-        img = Image.open(image_path)
-        img = img.point(lambda p: p * 0.6) # Darken for text
-        draw = ImageDraw.Draw(img)
-        try:
-            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 80)
-        except:
-            font = ImageFont.load_default()
-            
-        draw.text((50, 50), text, font=font, fill=(255, 255, 0))
-        
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        img.save(output_path)
+        # 1280x720، أقل من 2 MB، والنص بيتظبط مقاسه لوحده (thumbnail_engine)
+        thumbnail_engine.render_thumbnail(image_path, text, output_path)
         print(f"✅ Thumbnail Saved: {output_path}")
         return output_path
     except Exception as e:
@@ -0,0 +1,179 @@
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+from contextlib import contextmanager
+
+import http_engine
+
+# مخزن محلي للحقائق: الصفحة بتتقطع مرة واحدة وبنعيد التحميل بس لو الـ revision اتغيرت
+DB_PATH = os.environ.get("FACTS_DB_PATH", "assets/cache/facts.sqlite3")
+CHECK_INTERVAL = 24 * 3600   # نسأل ويكيبيديا عن revision جديدة مرة في اليوم
+WIKI_API = "https://en.wikipedia.org/w/api.php"
+
+_HEADINGS = re.compile(r'==.*?==+')
+_NEWLINES = re.compile(r'\n')
+_REFS = re.compile(r'\[.*?\]')
+
+@contextmanager
+def _connect():
+    os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS facts (
+            animal TEXT PRIMARY KEY,
+            title TEXT,
+            revision_id INTEGER,
+            facts_json TEXT,
+            summary TEXT,
+            fetched_at REAL,
+            checked_at REAL
+        )
+    """)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+def segment_facts(content, min_len=150, max_facts=10):
+    """Clean a Wikipedia page and cut it into facts of more than min_len characters."""
+    content = _HEADINGS.sub('', content)   # شيل العناوين
+    content = _NEWLINES.sub(' ', content)  # شيل السطور الفاضية
+    content = _REFS.sub('', content)       # شيل المصادر [1]
+
+    long_facts = []
+    current, length = [], 0
+    for s in content.split('. '):
+        current.append(s + ". ")
+        length += len(s) + 2
+        if length > min_len:
+            long_facts.append("".join(current).strip())
+            current, length = [], 0
+            if len(long_facts) >= max_facts: break
+    return long_facts
+
+def _first_sentences(text, n=3):
+    sentences = re.split(r'(?<=[.!?])\s+', text.strip())
+    return " ".join(sentences[:n])
+
+def latest_revision(title):
+    """Current revision id of a page, without downloading its content."""
+    try:
+        r = http_engine.get(WIKI_API, params={
+            "action": "query", "prop": "revisions", "rvprop": "ids",
+            "titles": title, "redirects": 1, "format": "json",
+        }, timeout=(10, 30))
+        pages = r.json().get("query", {}).get("pages", {})
+        for page in pages.values():
+            revisions = page.get("revisions")
+            if revisions:
+                return revisions[0]["revid"]
+    except Exception as e:
+        print(f"⚠️ Revision check failed for {title}: {e}")
+    return None
+
+def _query_page(title):
+    """Plain-text extract, revision id and disambiguation flag of one page, via the MediaWiki API."""
+    r = http_engine.get(WIKI_API, params={
+        "action": "query", "prop": "extracts|revisions|pageprops", "explaintext": 1,
+        "rvprop": "ids", "ppprop": "disambiguation",
+        "titles": title, "redirects": 1, "format": "json",
+    }, timeout=(10, 30), cache=False)  # الـ store نفسه هو الكاش، والـ revision check بيقرر امتى نعيد
+    r.raise_for_status()
+    page = next(iter(r.json().get("query", {}).get("pages", {}).values()), None)
+    if not page or "missing" in page or not page.get("extract"):
+        raise LookupError(f"No Wikipedia page for {title}")
+    return page
+
+def _fetch_page(animal):
+    page = _query_page(animal)
+    if "disambiguation" in page.get("pageprops", {}):
+        # صفحة توضيح: أول نتيجة بحث هي المعنى الأشهر
+        r = http_engine.get(WIKI_API, params={
+            "action": "query", "list": "search", "srsearch": animal, "srlimit": 5, "format": "json",
+        }, timeout=(10, 30), cache=False)
+        hits = [h["title"] for h in r.json().get("query", {}).get("search", []) if h["title"] != page["title"]]
+        if not hits:
+            raise LookupError(f"{animal} is a disambiguation page")
+        page = _query_page(hits[0])
+    content = page["extract"]
+    return {
+        "title": page["title"],
+        "revision_id": page["revisions"][0]["revid"],
+        "content": content,
+        # المقدمة = كل اللي قبل أول عنوان
+        "summary": re.split(r'\n==', content, maxsplit=1)[0],
+    }
+
+def _row(conn, animal):
+    cur = conn.execute(
+        "SELECT title, revision_id, facts_json, summary, checked_at FROM facts WHERE animal = ?",
+        (animal,))
+    return cur.fetchone()
+
+def refresh(animal, force=False):
+    """Bring one animal up to date. Only re-downloads the page if its revision changed."""
+    now = time.time()
+    with _connect() as conn:
+        row = _row(conn, animal)
+        if row and not force:
+            title, revision_id, _, _, checked_at = row
+            if checked_at and now - checked_at < CHECK_INTERVAL:
+                return False
+            latest = latest_revision(title)
+            if latest is None or latest == revision_id:
+                conn.execute("UPDATE facts SET checked_at = ? WHERE animal = ?", (now, animal))
+                return False
+
+        print(f"📚 Reading Full Wikipedia Page for: {animal}...")
+        try:
+            page = _fetch_page(animal)
+        except Exception as e:
+            print(f"⚠️ Wikipedia Error: {e}")
+            return False
+
+        facts = segment_facts(page["content"])
+        summary = _first_sentences(page["summary"], 3)
+        conn.execute(
+            "INSERT OR REPLACE INTO facts VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (animal, page["title"], page["revision_id"], json.dumps(facts), summary, now, now))
+        print(f"💾 Stored {len(facts)} facts for {animal} (rev {page['revision_id']})")
+        return True
+
+def _get(animal, column, offline=False):
+    if not offline:
+        refresh(animal)
+    with _connect() as conn:
+        row = _row(conn, animal)
+    if not row:
+        return None
+    return row[2] if column == "facts" else row[3]
+
+def get_facts(animal, offline=False):
+    """offline=True reads the local store only (no revision check, no download)."""
+    data = _get(animal, "facts", offline)
+    return json.loads(data) if data else []
+
+def get_summary(animal, offline=False):
+    return _get(animal, "summary", offline)
+
+def has_facts(animal):
+    with _connect() as conn:
+        return _row(conn, animal) is not None
+
+def refresh_all(animals=None, force=False):
+    """On-demand refresh of the given animals (default: everything already stored)."""
+    if animals is None:
+        with _connect() as conn:
+            animals = [r[0] for r in conn.execute("SELECT animal FROM facts")]
+    changed = sum(1 for a in animals if refresh(a, force=force))
+    print(f"✅ Fact store refresh: {changed}/{len(animals)} pages updated")
+    return changed
+
+if __name__ == "__main__":
+    # python scripts/facts_engine.py [--force] [Animal ...]
+    args = [a for a in sys.argv[1:] if a != "--force"]
+    refresh_all(args or None, force="--force" in sys.argv)
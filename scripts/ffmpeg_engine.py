@@ -0,0 +1,293 @@
+import os
+import math
+import shutil
+import time
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import cache_engine
+import config_engine
+import metrics_engine
+import probe_engine
+
+# محرك رندر بديل: ffmpeg واحد بـ filtergraph بدل MoviePy فريم فريم
+TARGETS = {
+    "long": (1280, 720),
+    "short": (1080, 1920),
+}
+
+def ffmpeg_bin():
+    found = shutil.which("ffmpeg")
+    if found:
+        return found
+    try:
+        import imageio_ffmpeg  # MoviePy بتنزل ffmpeg خاص بيها
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return None
+
+def ffprobe_bin():
+    return shutil.which("ffprobe")
+
+def available():
+    return bool(ffmpeg_bin() and ffprobe_bin())
+
+def probe(path):
+    """Width, height and duration (plus fps/codec/rotation) of any media file via ffprobe.
+
+    None if unreadable. Video clips should go through probe_engine.clip_info,
+    which caches the result per file.
+    """
+    info = probe_engine.probe_file(path)
+    if not info or not info["duration"]:
+        return None
+    return info
+
+def detect_mode(video_paths):
+    """Pick 'long' (landscape) or 'short' (portrait) from the clips' majority orientation."""
+    landscape = portrait = 0
+    for path in video_paths:
+        info = probe_engine.clip_info(path)
+        if not info or not info["valid"]:
+            continue
+        if info["width"] >= info["height"]:
+            landscape += 1
+        else:
+            portrait += 1
+    return "long" if landscape > portrait else "short"
+
+def _cover_filter(width, height, fps):
+    return (f"scale={width}:{height}:force_original_aspect_ratio=increase,"
+            f"crop={width}:{height},setsar=1,fps={fps},format=yuv420p")
+
+def _audio_graph(voice, duration, has_music, music_volume=0.15):
+    parts = [f"[{voice}:a]apad,atrim=0:{duration:.3f},asetpts=PTS-STARTPTS[voice]"]
+    if has_music:
+        # amix بيقسم على عدد المداخل، فبنرجع الصوت لمستواه بـ volume=2
+        parts.append(f"[{voice + 1}:a]atrim=0:{duration:.3f},asetpts=PTS-STARTPTS,volume={music_volume}[music]")
+        parts.append("[voice][music]amix=inputs=2:duration=first:dropout_transition=0,volume=2[aout]")
+    else:
+        parts.append("[voice]anull[aout]")
+    return parts
+
+def build_filtergraph(segment_durations, width, height, duration, fps=24, has_music=False, music_volume=0.15):
+    """Trim each clip to its segment length, scale/crop it to cover WxH, concat,
+    trim to duration and mix audio.
+
+    Inputs are expected in the order: clips..., voice, [music].
+    """
+    n_clips = len(segment_durations)
+    parts = [f"[{i}:v]trim=duration={d:.3f},setpts=PTS-STARTPTS,{_cover_filter(width, height, fps)}[v{i}]"
+             for i, d in enumerate(segment_durations)]
+    streams = "".join(f"[v{i}]" for i in range(n_clips))
+    parts.append(f"{streams}concat=n={n_clips}:v=1:a=0,trim=duration={duration:.3f},setpts=PTS-STARTPTS[vout]")
+    parts += _audio_graph(n_clips, duration, has_music, music_volume)
+    return ";".join(parts)
+
+MIN_SEGMENT = 2.0   # أقصر كليب مسموح بعد ما نقصه على حدود الحقيقة
+
+def plan_segments(video_paths, target_duration, boundaries=()):
+    """Valid clips, in order, with how long each one plays, until target_duration is covered.
+
+    When fact boundaries (seconds, from the TTS timing index) are given, a
+    clip that spans one is cut at the last boundary it covers, so shots
+    change together with the narration.
+    """
+    segments = []
+    start = 0.0
+    for path in video_paths:
+        if start >= target_duration: break
+        info = probe_engine.clip_info(path)
+        if not info or not info["valid"]:
+            print(f"⚠️ Skipped Bad Clip: {path} ({(info or {}).get('error')})")
+            continue
+        end = min(start + info["duration"], target_duration)
+        if end < target_duration:
+            snaps = [b for b in boundaries if start + MIN_SEGMENT <= b <= end]
+            if snaps:
+                end = max(snaps)
+        segments.append((path, end - start))
+        start = end
+    return segments
+
+def _run(cmd):
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"❌ ffmpeg failed: {result.stderr[-2000:]}")
+        return False
+    return True
+
+def _encode_args(profile, threads):
+    return ["-c:v", "libx264", "-preset", str(profile["preset"]), "-crf", str(profile["crf"]),
+            "-threads", str(threads), "-r", str(profile["fps"])]
+
+def _render_single(clips, audio_path, music_path, width, height, duration, profile, output_path):
+    has_music = bool(music_path)
+    cmd = [ffmpeg_bin(), "-y", "-hide_banner", "-loglevel", "error"]
+    for path, _ in clips:
+        cmd += ["-i", path]
+    cmd += ["-i", audio_path]
+    if has_music:
+        cmd += ["-stream_loop", "-1", "-i", music_path]
+
+    graph = build_filtergraph([d for _, d in clips], width, height, duration, fps=profile["fps"], has_music=has_music)
+    cmd += ["-filter_complex", graph, "-map", "[vout]", "-map", "[aout]"]
+    cmd += _encode_args(profile, profile["threads"])
+    cmd += ["-c:a", "aac", "-movflags", "+faststart", "-t", f"{duration:.3f}", output_path]
+    return _run(cmd)
+
+def normalized_key(src, width, height, profile, span=None):
+    """Media-cache key of the canonical WxH intermediate of src (its first span
+    seconds, or the whole clip when span is None)."""
+    fingerprint = cache_engine.file_fingerprint(src)
+    length = f"_{span}s" if span else ""
+    return f"norm_{fingerprint}_{width}x{height}_{profile['fps']}fps_crf{profile['crf']}_bf0{length}"
+
+def normalize_clip(src, width, height, profile, threads=0, seconds=None):
+    """Transcode a clip once to the canonical size/codec/fps/timebase; reused from cache after.
+
+    Every intermediate shares codec settings, fps, pixel format, GOP and
+    timebase, and has no B-frames and closed GOPs, so the final assembly can
+    cut it at any frame (outpoint) and join it with stream copy. With
+    seconds, only the head the edit plays is transcoded (rounded up to a
+    whole second so nearby lengths share an entry).
+    """
+    full = cache_engine.lookup(normalized_key(src, width, height, profile))
+    if full:
+        return full
+    info = probe_engine.clip_info(src)
+    span = math.ceil(seconds) if seconds and info and seconds + 1 < info["duration"] else None
+    key = normalized_key(src, width, height, profile, span)
+    cached = cache_engine.lookup(key)
+    if cached:
+        return cached
+    out = cache_engine.cache_path(key)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(out), suffix=".tmp")
+    os.close(fd)
+    fps = profile["fps"]
+    cmd = [ffmpeg_bin(), "-y", "-hide_banner", "-loglevel", "error", "-i", src]
+    if span:
+        cmd += ["-t", str(span)]
+    cmd += ["-vf", _cover_filter(width, height, fps), "-an",
+            "-g", str(fps), "-keyint_min", str(fps), "-sc_threshold", "0", "-bf", "0", "-flags", "+cgop",
+            "-video_track_timescale", str(fps * 512)]
+    cmd += _encode_args(profile, threads or profile["threads"])
+    cmd += ["-movflags", "+faststart", "-f", "mp4", tmp]
+    try:
+        if not _run(cmd):
+            return None
+        os.replace(tmp, out)
+        return out
+    finally:
+        # فشل أو exception أو Ctrl-C: الـ tmp ميفضلش في الكاش
+        if os.path.exists(tmp): os.remove(tmp)
+
+def _render_normalized(clips, audio_path, music_path, width, height, duration, profile, output_path):
+    """Normalize each clip (cached across runs, in parallel when segment_parallel is on),
+    then join the intermediates with stream copy; only the audio is encoded."""
+    os.makedirs(cache_engine.CACHE_DIR, exist_ok=True)
+    workers = min(profile["segment_workers"], len(clips)) if profile["segment_parallel"] else 1
+    threads = max(1, profile["threads"] // workers)
+
+    print(f"🧵 Normalizing {len(clips)} clips on {workers} workers x {threads} threads...")
+    # كل worker بيشغل ffmpeg process مستقل، فالـ threads هنا بس بتستنى
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        normalized = list(pool.map(lambda c: normalize_clip(c[0], width, height, profile, threads, c[1]), clips))
+    if not all(normalized):
+        return False
+
+    ok = concat_segments(list(zip(normalized, (d for _, d in clips))), audio_path, music_path,
+                         duration, output_path)
+    cache_engine.evict()
+    return ok
+
+def prepare_clip(path, mode):
+    """Normalize a freshly downloaded clip ahead of the edit, so render() finds the
+    intermediate in the cache and only has to join. Returns the intermediate or None."""
+    profile = config_engine.get_render_profile(mode)
+    if not (profile["normalize_cache"] or profile["segment_parallel"]) or not available():
+        return None
+    if not probe_engine.is_valid(path):
+        return None
+    width, height = TARGETS[mode]
+    threads = max(1, profile["threads"] // profile["segment_workers"])
+    try:
+        # الكليب نازل متقصوص على قد الـ trim، فالـ full-length هو نفسه اللي الـ edit هيطلبه
+        return normalize_clip(path, width, height, profile, threads)
+    except Exception as e:
+        print(f"⚠️ Early normalize failed for {path}: {e}")
+        return None
+
+def concat_segments(segments, audio_path, music_path, duration, output_path):
+    """Join already-encoded (path, seconds) segments with stream copy and mux the audio."""
+    list_path = os.path.splitext(output_path)[0] + "_concat.txt"
+    with open(list_path, "w") as f:
+        for path, seg_duration in segments:
+            f.write(f"file '{os.path.abspath(path)}'\noutpoint {seg_duration:.3f}\n")
+
+    has_music = bool(music_path)
+    cmd = [ffmpeg_bin(), "-y", "-hide_banner", "-loglevel", "error",
+           "-f", "concat", "-safe", "0", "-i", list_path, "-i", audio_path]
+    if has_music:
+        cmd += ["-stream_loop", "-1", "-i", music_path]
+    cmd += ["-filter_complex", ";".join(_audio_graph(1, duration, has_music)),
+            "-map", "0:v", "-map", "[aout]", "-c:v", "copy", "-c:a", "aac",
+            "-movflags", "+faststart", "-t", f"{duration:.3f}", output_path]
+    try:
+        return _run(cmd)
+    finally:
+        os.remove(list_path)
+
+def render(video_paths, audio_path, music_path=None, mode=None, output_path="assets/final_video.mp4",
+           profile=None, timing=None):
+    """Render the whole video with ffmpeg subprocesses. Returns output_path or None.
+
+    profile is a render profile from config_engine.get_render_profile(); with
+    normalize_cache on, clips go through the cached canonical intermediates
+    and are joined without re-encoding (in parallel with segment_parallel). timing is the TTS timing index from voice_engine:
+    it gives the narration length without probing the audio, and its fact
+    boundaries become the clip cut points.
+    """
+    if not available():
+        print("⚠️ ffmpeg/ffprobe not found, can't use fast render")
+        return None
+
+    if timing:
+        voice_duration = timing["duration"]
+    else:
+        voice = probe(audio_path)
+        voice_duration = voice["duration"] if voice else 0
+    if not voice_duration:
+        print("❌ Could not read voice duration")
+        return None
+    target_duration = voice_duration + 1.0
+
+    if mode not in TARGETS:
+        mode = detect_mode(video_paths)
+    width, height = TARGETS[mode]
+    profile = profile or config_engine.get_render_profile(mode)
+    print(f"⚡ FFMPEG RENDER: Mode={mode} | {width}x{height} | {profile['fps']}fps {profile['preset']} crf={profile['crf']}")
+
+    clips = plan_segments(video_paths, target_duration, (timing or {}).get("fact_end", ()))
+    if not clips:
+        print("❌ ERROR: No valid clips processed!")
+        return None
+
+    if not (music_path and os.path.exists(music_path)):
+        music_path = None
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+    started = time.time()
+    if profile["normalize_cache"] or profile["segment_parallel"]:
+        ok = _render_normalized(clips, audio_path, music_path, width, height, target_duration, profile, output_path)
+    else:
+        print(f"💾 Rendering {len(clips)} clips with ffmpeg...")
+        ok = _render_single(clips, audio_path, music_path, width, height, target_duration, profile, output_path)
+    if not ok:
+        return None
+    metrics_engine.add_frames(int(target_duration * profile["fps"]))
+
+    per_minute = (time.time() - started) / (target_duration / 60)
+    print(f"⏱️ Render speed: {per_minute:.1f}s per output minute (target {profile['target_seconds_per_minute']}s)")
+    return output_path
@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# كلاينت HTTP واحد لكل الـ APIs: session مشتركة، timeouts، كاش على الديسك بـ ETag/Last-Modified
+HTTP_CACHE_DIR = os.environ.get("HTTP_CACHE_DIR", "assets/cache/http")
+HTTP_CACHE_MAX_BYTES = int(os.environ.get("HTTP_CACHE_MAX_MB", "256")) * 1024 * 1024
+EVICT_EVERY = 50   # كل كام رد جديد بنشوف حجم الكاش
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 30
+POOL_SIZE = 8
+# أقصى عدد requests في نفس الوقت لكل host (الباقي بياخد DEFAULT_HOST_LIMIT)
+HOST_LIMITS = {"api.pexels.com": 2, "pixabay.com": 2, "en.wikipedia.org": 4}
+DEFAULT_HOST_LIMIT = 6
+# الـ headers اللي بنحفظها مع الرد (الباقي مالوش لازمة بعد كده)
+_KEEP_HEADERS = ("content-type", "etag", "last-modified", "cache-control", "date", "expires")
+
+_session = None
+_session_lock = threading.Lock()
+_host_slots = {}
+_stats = {"fresh": 0, "revalidated": 0, "miss": 0, "uncacheable": 0, "bytes_saved": 0}
+_stats_lock = threading.Lock()
+
+def get_session():
+    """Shared keep-alive session for every API call and download."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE * 2)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+@contextmanager
+def host_slot(url):
+    """Hold one of the host's concurrency slots for the duration of a request."""
+    host = urlsplit(url).hostname or ""
+    with _session_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = _host_slots[host] = threading.BoundedSemaphore(HOST_LIMITS.get(host, DEFAULT_HOST_LIMIT))
+    with slot:
+        yield
+
+def _count(kind, saved=0):
+    with _stats_lock:
+        _stats[kind] += 1
+        _stats["bytes_saved"] += saved
+
+def stats():
+    """Hit/miss counters since the process started."""
+    with _stats_lock:
+        s = dict(_stats)
+    lookups = s["fresh"] + s["revalidated"] + s["miss"]
+    s["hit_rate"] = round((s["fresh"] + s["revalidated"]) / lookups, 3) if lookups else 0.0
+    return s
+
+def _cache_key(url, params, headers):
+    # الـ API key جزء من الـ key (كل حساب ليه رد)، بس متخزنش كنص
+    auth = (headers or {}).get("Authorization", "")
+    raw = json.dumps([url, sorted((params or {}).items()), hashlib.sha1(auth.encode()).hexdigest()], default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def _paths(key):
+    base = os.path.join(HTTP_CACHE_DIR, key)
+    return base + ".json", base + ".body"
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def _directives(headers):
+    out = {}
+    for part in (headers.get("cache-control") or "").lower().split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            out[name] = value.strip('"')
+    return out
+
+def _max_age(headers, default_ttl):
+    """Seconds the stored response is fresh for, per Cache-Control (or Expires, or default_ttl)."""
+    cc = _directives(headers)
+    if "no-cache" in cc:
+        return 0
+    for name in ("s-maxage", "max-age"):
+        if name in cc:
+            try:
+                return int(cc[name])
+            except ValueError:
+                return 0
+    if headers.get("expires"):
+        try:
+            return max(0, parsedate_to_datetime(headers["expires"]).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return 0
+    return default_ttl
+
+def _load(key):
+    meta_path, body_path = _paths(key)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        with open(body_path, "rb") as f:
+            body = f.read()
+        os.utime(meta_path)  # الـ LRU بيمشي بآخر استخدام
+        return meta, body
+    except (OSError, ValueError):
+        return None, None
+
+def evict(max_bytes=HTTP_CACHE_MAX_BYTES):
+    """Delete least recently used responses (meta + body) until the HTTP cache fits in max_bytes."""
+    if not os.path.isdir(HTTP_CACHE_DIR):
+        return 0
+    entries, total = {}, 0
+    for name in os.listdir(HTTP_CACHE_DIR):
+        path = os.path.join(HTTP_CACHE_DIR, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if name.endswith(".tmp"):
+            if time.time() - st.st_mtime > 3600:  # write اتقطع
+                os.remove(path)
+            continue
+        key = name.rsplit(".", 1)[0]
+        used, size = entries.get(key, (0, 0))
+        entries[key] = (max(used, st.st_mtime), size + st.st_size)
+        total += st.st_size
+
+    removed = 0
+    for key, (_, size) in sorted(entries.items(), key=lambda e: e[1][0]):
+        if total <= max_bytes:
+            break
+        for path in _paths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        total -= size
+        removed += 1
+    if removed:
+        print(f"🧹 HTTP cache: evicted {removed} old responses")
+    return removed
+
+def _store(key, url, response, body, default_ttl):
+    headers = {h: response.headers[h] for h in _KEEP_HEADERS if h in response.headers}
+    meta = {"url": url, "headers": headers, "stored_at": time.time(),
+            "max_age": _max_age(CaseInsensitiveDict(headers), default_ttl)}
+    meta_path, body_path = _paths(key)
+    _write(body_path, body)
+    _write(meta_path, json.dumps(meta).encode())
+
+def _from_cache(meta, body, url, status, extra_headers=None):
+    r = requests.Response()
+    r.status_code = 200
+    r._content = body
+    r.headers = CaseInsensitiveDict(meta["headers"])
+    r.headers.update(extra_headers or {})
+    r.url = url
+    r.encoding = "utf-8"
+    r.from_cache = True
+    r.cache_status = status
+    return r
+
+def get(url, params=None, headers=None, timeout=None, cache=True, default_ttl=0):
+    """GET through the shared session and the on-disk HTTP cache.
+
+    A stored response is served without a request while Cache-Control says
+    it is fresh (default_ttl when the server sends no freshness info), then
+    revalidated with If-None-Match / If-Modified-Since; a 304 reuses the
+    stored body. Only 200s are stored, never no-store ones. Responses carry
+    from_cache (True when no body was downloaded) and cache_status ("fresh",
+    "revalidated", "miss" or None). Query values go through params, so they
+    are URL-encoded.
+    """
+    timeout = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+    key = _cache_key(url, params, headers) if cache else None
+    meta, body = _load(key) if key else (None, None)
+
+    if meta and time.time() - meta["stored_at"] < meta["max_age"]:
+        _count("fresh", len(body))
+        return _from_cache(meta, body, url, "fresh")
+
+    send = dict(headers or {})
+    if meta:
+        if meta["headers"].get("etag"):
+            send["If-None-Match"] = meta["headers"]["etag"]
+        if meta["headers"].get("last-modified"):
+            send["If-Modified-Since"] = meta["headers"]["last-modified"]
+
+    with host_slot(url):
+        r = get_session().get(url, params=params, headers=send, timeout=timeout)
+
+    if meta and r.status_code == 304:
+        _count("revalidated", len(body))
+        meta["headers"].update({h: r.headers[h] for h in _KEEP_HEADERS if h in r.headers})
+        meta["stored_at"] = time.time()
+        meta["max_age"] = _max_age(CaseInsensitiveDict(meta["headers"]), default_ttl)
+        _write(_paths(key)[0], json.dumps(meta).encode())
+        # الـ 304 بيجيب headers جديدة (rate limits مثلًا) فبنرجعها مع الـ body القديم
+        fresh_headers = {k: v for k, v in r.headers.items()
+                         if k.lower() not in ("content-length", "content-encoding", "transfer-encoding")}
+        return _from_cache(meta, body, url, "revalidated", extra_headers=fresh_headers)
+
+    r.from_cache = False
+    r.cache_status = None
+    if not key or r.status_code != 200 or "no-store" in _directives(r.headers):
+        _count("uncacheable")
+        return r
+    _count("miss")
+    r.cache_status = "miss"
+    _store(key, url, r, r.content, default_ttl)
+    if _stats["miss"] % EVICT_EVERY == 1:
+        evict()
+    return r
+
+def post(url, timeout=None, **kwargs):
+    """POST through the shared session (never cached)."""
+    with host_slot(url):
+        return get_session().post(url, timeout=timeout or (CONNECT_TIMEOUT, READ_TIMEOUT), **kwargs)
+
+@contextmanager
+def stream(url, headers=None, timeout=None):
+    """Streaming GET for large downloads: pooled session + host slot, no cache."""
+    with host_slot(url):
+        with get_session().get(url, stream=True, headers=headers,
+                               timeout=timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)) as r:
+            yield r
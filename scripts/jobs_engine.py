@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+from contextlib import contextmanager
+
+import cache_engine
+
+# طابور الفيديوهات + checkpoint لكل مرحلة، عشان الرن اللي يقع يكمل من مكانه
+DB_PATH = os.environ.get("JOBS_DB_PATH", "assets/cache/jobs.sqlite3")
+# فولدر الشغل جوه assets/cache عشان يعدي بين رنز الـ workflow مع الكاش
+JOBS_DIR = os.environ.get("JOBS_DIR", "assets/cache/jobs")
+MAX_ATTEMPTS = 3
+
+@contextmanager
+def _connect():
+    os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            mode TEXT,
+            animal TEXT,
+            status TEXT,
+            attempts INTEGER DEFAULT 0,
+            video_id TEXT,
+            error TEXT,
+            created_at REAL,
+            updated_at REAL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS checkpoints (
+            job_id INTEGER,
+            stage TEXT,
+            result_json TEXT,
+            files_json TEXT,
+            created_at REAL,
+            PRIMARY KEY (job_id, stage)
+        )
+    """)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+def _job(row):
+    keys = ("id", "mode", "animal", "status", "attempts", "video_id", "error")
+    return dict(zip(keys, row)) if row else None
+
+_COLUMNS = "id, mode, animal, status, attempts, video_id, error"
+
+def work_dir(job):
+    return os.path.join(JOBS_DIR, f"job_{job['id']}_{job['mode']}")
+
+def enqueue(mode, animal=None):
+    now = time.time()
+    with _connect() as conn:
+        cur = conn.execute(
+            "INSERT INTO jobs (mode, animal, status, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?)",
+            (mode, animal, now, now))
+        job_id = cur.lastrowid
+    print(f"📥 Queued job {job_id}: {mode}" + (f" ({animal})" if animal else ""))
+    return job_id
+
+def get(job_id):
+    with _connect() as conn:
+        return _job(conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+def pending():
+    """Jobs still to do, interrupted ones (they have checkpoints) first, then FIFO."""
+    with _connect() as conn:
+        rows = conn.execute(f"""
+            SELECT {_COLUMNS} FROM jobs
+            WHERE status IN ('queued', 'running', 'failed') AND attempts < ?
+            ORDER BY status = 'queued', id
+        """, (MAX_ATTEMPTS,)).fetchall()
+    return [_job(r) for r in rows]
+
+def claim(job_id, animal=None):
+    """Mark a job running and count the attempt; the subject is fixed on first claim."""
+    with _connect() as conn:
+        conn.execute("""
+            UPDATE jobs SET status = 'running', attempts = attempts + 1,
+                            animal = COALESCE(animal, ?), updated_at = ?
+            WHERE id = ?
+        """, (animal, time.time(), job_id))
+    return get(job_id)
+
+def _discard(job):
+    """Drop a finished job's checkpoints and work dir (rendered video, voice, clips)."""
+    with _connect() as conn:
+        conn.execute("DELETE FROM checkpoints WHERE job_id = ?", (job["id"],))
+    shutil.rmtree(work_dir(job), ignore_errors=True)
+
+def finish(job_id, status, video_id=None, error=None):
+    with _connect() as conn:
+        conn.execute("UPDATE jobs SET status = ?, video_id = COALESCE(?, video_id), error = ?, updated_at = ? WHERE id = ?",
+                     (status, video_id, error, time.time(), job_id))
+    job = get(job_id)
+    # job خلص محاولاته مش هيترجعله تاني، فمفيش لازمة لفولدره
+    if status == "done" or job["attempts"] >= MAX_ATTEMPTS:
+        _discard(job)
+
+def prune():
+    """Remove work dirs of jobs that will never run again (done, out of attempts or gone).
+
+    JOBS_DIR rides along with assets/cache between workflow runs, so
+    anything left behind here would pile up forever.
+    """
+    if not os.path.isdir(JOBS_DIR):
+        return 0
+    live = {os.path.basename(work_dir(job)) for job in pending()}
+    removed = 0
+    for name in os.listdir(JOBS_DIR):
+        if name.startswith("job_") and name not in live:
+            shutil.rmtree(os.path.join(JOBS_DIR, name), ignore_errors=True)
+            removed += 1
+    if removed:
+        print(f"🧹 Removed {removed} stale job dir(s)")
+    return removed
+
+def _files_in(result):
+    """Every existing file path mentioned anywhere in a stage result."""
+    if isinstance(result, str):
+        return [result] if os.path.isfile(result) else []
+    if isinstance(result, dict):
+        result = list(result.values())
+    if isinstance(result, (list, tuple)):
+        return [p for item in result for p in _files_in(item)]
+    return []
+
+def save_checkpoint(job_id, stage, result):
+    """Persist a stage's output (must be JSON-serialisable) plus fingerprints of the files it names."""
+    files = {p: cache_engine.file_fingerprint(p) for p in _files_in(result)}
+    with _connect() as conn:
+        conn.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?)",
+                     (job_id, stage, json.dumps(result), json.dumps(files), time.time()))
+
+def load_checkpoints(job_id):
+    """{stage: result} for checkpoints whose files are still there and unchanged."""
+    with _connect() as conn:
+        rows = conn.execute("SELECT stage, result_json, files_json FROM checkpoints WHERE job_id = ?",
+                            (job_id,)).fetchall()
+    done = {}
+    for stage, result_json, files_json in rows:
+        files = json.loads(files_json)
+        if all(os.path.isfile(p) and cache_engine.file_fingerprint(p) == fp for p, fp in files.items()):
+            done[stage] = json.loads(result_json)
+        else:
+            print(f"♻️ Checkpoint {stage} of job {job_id} is stale, redoing it")
+    return done
+
+def status():
+    with _connect() as conn:
+        return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+if __name__ == "__main__":
+    # python scripts/jobs_engine.py  → حالة الطابور
+    for job in pending():
+        print(f"{job['id']:>4}  {job['mode']:<6} {job['animal'] or '-':<20} {job['status']:<8} attempts={job['attempts']}")
+    print(status())
@@ -1,105 +1,361 @@
+import time
+_IMPORT_T0 = time.perf_counter()
+
 import os
 import sys
-import random
 import json
+import shutil
+import importlib
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from content_engine import generate_script
-from media_engine import gather_media, download_video, get_thumbnail_image
-from voice_engine import generate_voice
-from editor_engine import create_video, create_thumbnail
-from uploader_engine import upload_video
-
-def get_random_animal():
-    animals = [
-        "Jaguar", "Polar Bear", "Komodo Dragon", "Great White Shark", "Saltwater Crocodile", 
-        "Gray Wolf", "Cheetah", "Grizzly Bear", "Red Panda", "Quokka", "Sea Otter", 
-        "Capybara", "Fennec Fox", "Koala", "Sloth", "Meerkat", "Emperor Penguin", 
-        "Blue Whale", "Mantis Shrimp", "Orca", "Hammerhead Shark", "Shoebill Stork", 
-        "Peregrine Falcon", "Snowy Owl", "Eagle", "Toucan", "Praying Mantis", 
-        "Hercules Beetle", "Platypus", "Axolotl", "Pangolin", "Honey Badger"
-    ]
-    selected = random.choice(animals)
-    print(f"🎲 System Selected: {selected}")
-    return selected
+import planner_engine
+import config_engine
+import jobs_engine
+import metrics_engine
+from pipeline_engine import run_stages, stage
 
-def execute_run(mode):
-    print(f"\n{'='*30}\n🚀 STARTING PIPELINE: {mode.upper()}\n{'='*30}")
-    
-    try:
-        animal = get_random_animal()
-        print(f"🦁 Subject: {animal}")
-        
-        # 1. Script
-        script_data = generate_script(animal, mode=mode)
-        
-        # 2. Voice
-        audio_path = generate_voice(script_data['script_text'])
+# كل engine بيتحمل أول ما مرحلته تشتغل: رن بيقع في السكريبت مبيدفعش تمن MoviePy وجوجل
+LAZY_IMPORTS = {}   # module -> seconds it took to import
+
+def _load(module):
+    if module not in sys.modules:
+        t0 = time.perf_counter()
+        importlib.import_module(module)
+        LAZY_IMPORTS[module] = round(time.perf_counter() - t0, 3)
+        print(f"📦 Loaded {module} in {LAZY_IMPORTS[module]:.2f}s")
+    return sys.modules[module]
+
+def _lazy(module, name):
+    """Stand-in for module.name that imports the module on first call.
+    Module attributes, so tests and benchmarks can still patch them."""
+    def call(*args, **kwargs):
+        return getattr(_load(module), name)(*args, **kwargs)
+    call.__name__ = name
+    return call
+
+generate_script = _lazy("content_engine", "generate_script")
+expected_script = _lazy("content_engine", "expected_script")
+search_videos = _lazy("media_engine", "search_videos")
+download_videos = _lazy("media_engine", "download_videos")
+get_thumbnail_image = _lazy("media_engine", "get_thumbnail_image")
+generate_voice = _lazy("voice_engine", "generate_voice")
+load_timing = _lazy("voice_engine", "load_timing")
+estimate_duration = _lazy("voice_engine", "estimate_duration")
+create_video = _lazy("editor_engine", "create_video")
+create_thumbnail = _lazy("editor_engine", "create_thumbnail")
+upload_video = _lazy("uploader_engine", "upload_video")
+forget_upload = _lazy("uploader_engine", "forget_upload")
+pick_subject = _lazy("scheduler_engine", "pick")
+
+IMPORT_SECONDS = round(time.perf_counter() - _IMPORT_T0, 3)
+
+def _download_clips(videos, work_dir, seconds, mode):
+    # التحميل بالتوازي، وبنرجع الترتيب الأصلي بعد ما يخلصوا
+    # كل رن ليه فولدر مؤقت، والكليبات نفسها جاية من الكاش
+    if not videos: raise Exception("No media found")
+    # الخطة قبل التحميل: أقل كليبات تغطي الصوت، وكل كليب هناخد منه قد إيه
+    plan = planner_engine.plan_clips(videos, seconds)
+    print(f"📐 Clip plan for ~{seconds:.0f}s narration: {planner_engine.summarize(plan)}")
+    downloaded = {}
+    urls = [v['link'] for v in plan]
+    keys = [v['key'] for v in plan]
+    trims = [v['trim'] for v in plan]
+    # كل كليب يخلص تحميل بيتعمله normalize على طول والباقي لسه بينزل،
+    # فالـ edit بيلاقي الـ intermediates في الكاش ومبيعملش غير الـ concat
+    prepare = metrics_engine.in_stage(_load("ffmpeg_engine").prepare_clip)
+    with ThreadPoolExecutor(config_engine.get_render_profile(mode)["segment_workers"]) as pool:
+        for i, path in download_videos(urls, work_dir, keys=keys, trims=trims):
+            if path:
+                downloaded[i] = path
+                pool.submit(prepare, path, mode)
+    local_videos = [downloaded[i] for i in sorted(downloaded)]
+    if len(local_videos) < 2: raise Exception("Downloads failed")
+    return local_videos
+
+def _top_up(videos, clips, work_dir, seconds, mode):
+    """The footage was planned from an estimate; once the real narration length
+    is known, fetch more only if the downloaded clips don't cover it."""
+    infos = [_load("probe_engine").clip_info(p) for p in clips]
+    if not seconds or any(i is None for i in infos):
+        return clips  # مفيش ffprobe أو timing: مش هنعرف نحكم
+    have = sum(i["duration"] for i in infos if i["valid"])
+    if have >= seconds:
+        return clips
+    print(f"📐 Footage covers {have:.0f}s of {seconds:.0f}s narration, topping up")
+    return _download_clips(videos, os.path.join(work_dir, "topup"), seconds, mode)
+
+def build_stages(animal, mode, work_dir=None):
+    """Stage graph for one video. Footage and thumbnail fetches only need the
+    animal name, so they run alongside script writing and TTS; the real
+    narration length only tops the footage up when the estimate fell short.
+    Every file the run writes goes under work_dir, so several runs can be
+    in flight at once."""
+    work_dir = work_dir or f"assets/temp/{mode}"
+    orientation, limit = _load("search_engine").MODE_SEARCH[mode]
+
+    local_music = "background.mp3"
+    music_path = local_music if os.path.exists(local_music) else None
+
+    def voice(script):
+        audio_path = generate_voice(script['script_text'], output_path=os.path.join(work_dir, "voice.mp3"))
         if not audio_path: raise Exception("Voice failed")
+        return audio_path
 
-        # 3. Music
-        local_music = "background.mp3"
-        music_path = local_music if os.path.exists(local_music) else None
-
-        # 4. Media
-        orientation = "landscape" if mode == "long" else "portrait"
-        limit = 20 if mode == "long" else 5 # بنطلب 20 فيديو عشان نغطي الـ 3 دقايق
-        
-        video_urls = gather_media(animal, orientation=orientation, limit=limit)
-        if not video_urls: raise Exception("No media found")
-
-        local_videos = []
-        os.makedirs("assets/temp", exist_ok=True)
-        for i, url in enumerate(video_urls):
-            path = f"assets/temp/clip_{i}.mp4"
-            try:
-                download_video(url, path)
-                local_videos.append(path)
-            except: pass
-        
-        if len(local_videos) < 2: raise Exception("Downloads failed")
-
-        # 5. Edit
-        final_video = create_video(local_videos, audio_path, music_path, mode=mode)
+    def footage(media_search, download, voice):
+        timing = load_timing(voice)
+        return _top_up(media_search, download, work_dir, timing and timing["duration"] + 1.0, mode)
+
+    def edit(voice, footage):
+        final_video = create_video(footage, voice, music_path, mode=mode,
+                                   output_path=os.path.join(work_dir, "final_video.mp4"),
+                                   timing=load_timing(voice))
         if not final_video: raise Exception("Editing failed")
+        return final_video
+
+    def thumbnail(thumb_image):
+        if not thumb_image: return None
+        return create_thumbnail(thumb_image, f"{animal} FACTS", output_path=os.path.join(work_dir, "final_thumb.jpg"))
+
+    def upload(script, edit, thumbnail=None):
+        video_id = upload_video(edit, script['title'], script['description'], script['tags'], thumbnail)
+        if not video_id: raise Exception("Upload failed (No ID returned)")
+        return video_id
+
+    stages = {
+        "script": stage(lambda: generate_script(animal, mode=mode)),
+        "voice": stage(voice, "script"),
+        "media_search": stage(lambda: search_videos(animal, orientation=orientation, limit=limit)),
+        # التحميل مش مستني السكريبت: التقدير من expected_script زي scheduler_engine.prefetch بالظبط،
+        # فالـ trims والـ head keys تطابق الكاش، وبعد الـ TTS الـ footage stage بيكمل لو ناقص
+        "download": stage(lambda media_search: _download_clips(
+            media_search, work_dir, estimate_duration(expected_script(animal, mode, offline=True)) + 1.0, mode),
+            "media_search"),
+        "footage": stage(footage, "media_search", "download", "voice"),
+        "edit": stage(edit, "voice", "footage"),
+        "upload": stage(upload, "script", "edit"),
+    }
+    # Thumbnail (Long Only)
+    if mode == "long":
+        stages["thumb_image"] = stage(lambda: get_thumbnail_image(animal, output_path=os.path.join(work_dir, "thumb_bg.jpg")))
+        stages["thumbnail"] = stage(thumbnail, "thumb_image")
+        stages["upload"] = stage(upload, "script", "edit", "thumbnail")
+    return stages
+
+def execute_run(mode):
+    return run_job(jobs_engine.enqueue(mode))
+
+def run_job(job_id):
+    """Run (or resume) one queued job. Every finished stage is checkpointed in
+    the job store, so a rerun after a crash skips straight past them."""
+    job = jobs_engine.get(job_id)
+    mode = job["mode"]
+    print(f"\n{'='*30}\n🚀 STARTING PIPELINE: {mode.upper()} (job {job_id})\n{'='*30}")
+    metrics_engine.start_run(mode, job=job_id, import_s=IMPORT_SECONDS)
+    status = "failed"
+    video_id, error = None, None
 
-        # 6. Thumbnail (Long Only)
-        thumb_path = None
-        if mode == "long":
-            raw_thumb = get_thumbnail_image(animal)
-            if raw_thumb:
-                thumb_path = create_thumbnail(raw_thumb, f"{animal} FACTS")
-
-        # 7. Upload
-        video_id = upload_video(
-            final_video, 
-            script_data['title'], 
-            script_data['description'], 
-            script_data['tags'],
-            thumb_path
-        )
-        
-        if video_id:
-            print(f"✅ SUCCESS! {mode} video live: https://youtu.be/{video_id}")
-        else:
-            print("❌ Upload failed (No ID returned)")
+    try:
+        with metrics_engine.stage("subject"):
+            # الـ animal بيتثبت أول مرة، فالـ resume بيكمل نفس الفيديو
+            job = jobs_engine.claim(job_id, job["animal"] or pick_subject(mode))
+        animal = job["animal"]
+        print(f"🦁 Subject: {animal}")
+
+        done = jobs_engine.load_checkpoints(job_id)
+        if done:
+            print(f"⏩ Resuming job {job_id} after: {', '.join(sorted(done))}")
+        results = run_stages(build_stages(animal, mode, jobs_engine.work_dir(job)), done=done,
+                             on_result=lambda name, result: jobs_engine.save_checkpoint(job_id, name, result))
+        video_id = results["upload"]
+        status = "ok"
+        print(f"✅ SUCCESS! {mode} video live: https://youtu.be/{video_id}")
 
     except Exception as e:
+        error = str(e)
         print(f"❌ PIPELINE FAILED for {mode}:")
         traceback.print_exc()
+    finally:
+        if status == "ok" and results.get("edit"):
+            # الـ video_id هيتسجل في الـ job store، فالـ upload session مش محتاجينها.
+            # لازم قبل finish عشان finish بيمسح الـ work dir والفيديو معاه
+            forget_upload(results["edit"])
+        jobs_engine.finish(job_id, "done" if status == "ok" else "failed", video_id=video_id, error=error)
+        http = sys.modules.get("http_engine")
+        metrics_engine.finish_run(status, job=job_id, lazy_imports=dict(LAZY_IMPORTS),
+                                  http_cache=http.stats() if http else None)
+    return video_id
+
+def drain(modes=None, limit=None, prefetch=True):
+    """Work through the job queue; interrupted jobs resume first.
+
+    An empty queue gets modes enqueued, or else today's planned schedule
+    (once per day). At most limit jobs run; afterwards, while nothing else
+    is running, the footage/facts/narration of the next queued jobs is
+    prefetched into the cache for the following run. Work dirs of jobs
+    that won't run again are pruned first.
+    """
+    jobs_engine.prune()
+    if not jobs_engine.pending():
+        if modes:
+            for mode in modes:
+                jobs_engine.enqueue(mode)
+        elif not _load("scheduler_engine").planned():
+            for slot in _load("scheduler_engine").plan_day(daily_queue()):
+                jobs_engine.enqueue(slot["mode"], slot["animal"])
+    queue = jobs_engine.pending()[:limit]
+    print(f"\n📋 Draining {len(queue)} job(s)")
+    uploaded = sum(1 for job in queue if run_job(job["id"]))
+    print(f"📋 Queue drained: {uploaded}/{len(queue)} uploaded, {jobs_engine.status()}")
+
+    if prefetch:
+        for job in jobs_engine.pending()[:limit]:
+            if job["animal"]:
+                try:
+                    _load("scheduler_engine").prefetch(job["animal"], job["mode"])
+                except Exception as e:
+                    print(f"⚠️ Prefetch failed for {job['animal']}: {e}")
+    return uploaded
+
+def plan_run(mode, animal=None):
+    """Dry run: subject, script, clip plan and expected durations, without
+    loading the render or upload stacks and without touching the history."""
+    started = time.perf_counter()
+    animal = animal or pick_subject(mode, record=False)
+    script = generate_script(animal, mode=mode)
+    narration = estimate_duration(script['script_text'])
+    orientation, limit = _load("search_engine").MODE_SEARCH[mode]
+    videos = search_videos(animal, orientation=orientation, limit=limit)
+    # نفس خطة الـ download stage
+    clips = planner_engine.plan_clips(videos, estimate_duration(expected_script(animal, mode, offline=True)) + 1.0)
+    profile = config_engine.get_render_profile(mode)
+    video_seconds = narration + 1.0
+    plan = {
+        "mode": mode,
+        "animal": animal,
+        "title": script['title'],
+        "script_words": len(script['script_text'].split()),
+        "narration_s": round(narration, 1),
+        "video_s": round(video_seconds, 1),
+        "clips": [{"id": c.get('id'), "provider": c.get('provider'), "duration": c.get('duration'),
+                   "trim": c['trim']} for c in clips],
+        "clip_plan": planner_engine.summarize(clips),
+        "render_estimate_s": round(video_seconds / 60 * profile['target_seconds_per_minute'], 1),
+        "import_s": IMPORT_SECONDS,
+        "lazy_imports": dict(LAZY_IMPORTS),
+        "plan_s": round(time.perf_counter() - started, 2),
+    }
+    heavy = [m for m in ("moviepy", "googleapiclient", "edge_tts") if m in sys.modules]
+    if heavy:
+        print(f"⚠️ Plan mode loaded render/upload modules: {heavy}")
+    print(json.dumps(plan, indent=2, ensure_ascii=False))
+    return plan
+
+def daily_queue(settings=None):
+    """Today's schedule for drain: the dual run (short + long) once per scheduled
+    run, video.runs_daily times (4 crons in the workflow = 4 shorts + 4 long)."""
+    video = (settings or config_engine.load_settings()).get("video", {})
+    return ["short", "long"] * int(video.get("runs_daily", 4))
+
+def batch_queue(settings=None):
+    """Modes to produce in one batch: video.shorts_daily shorts + video.long_daily long videos."""
+    video = (settings or config_engine.load_settings()).get("video", {})
+    return ["short"] * int(video.get("shorts_daily", 1)) + ["long"] * int(video.get("long_daily", 1))
+
+def run_batch(modes):
+    """Produce several videos in one process, pipelined across three lanes.
+
+    Video k+1 gathers script/voice/footage while video k renders and video
+    k-1 uploads. Imports, the HTTP session, the YouTube client and the
+    media cache stay warm for the whole batch.
+    """
+    print(f"\n{'='*30}\n📦 BATCH: {len(modes)} videos ({', '.join(modes)})\n{'='*30}")
+    metrics_engine.start_run("batch", queue=modes)
+
+    chosen = []
+    jobs = []
+    for k, mode in enumerate(modes):
+        animal = pick_subject(mode, exclude=chosen)
+        chosen.append(animal)
+        work_dir = f"assets/temp/job_{k}_{mode}"
+        jobs.append((k, mode, animal, work_dir, build_stages(animal, mode, work_dir)))
+
+    def prepare(job):
+        k, mode, animal, work_dir, stages = job
+        prep = {n: st for n, st in stages.items() if n not in ("edit", "upload")}
+        return run_stages(prep, prefix=f"{k}.")
+
+    def render(job, prepared):
+        k, mode, animal, work_dir, stages = job
+        return run_stages({"edit": stages["edit"]}, done=prepared.result(), prefix=f"{k}.")
+
+    def publish(job, rendered):
+        k, mode, animal, work_dir, stages = job
+        results = run_stages({"upload": stages["upload"]}, done=rendered.result(), prefix=f"{k}.")
+        forget_upload(results["edit"])
+        shutil.rmtree(work_dir, ignore_errors=True)
+        return results["upload"]
+
+    # lane واحد لكل نوع شغل، فالترتيب جوه كل lane محفوظ
+    uploaded = 0
+    with ThreadPoolExecutor(1) as prep_lane, ThreadPoolExecutor(1) as render_lane, ThreadPoolExecutor(1) as upload_lane:
+        futures = []
+        for job in jobs:
+            prepared = prep_lane.submit(prepare, job)
+            rendered = render_lane.submit(render, job, prepared)
+            futures.append((job, upload_lane.submit(publish, job, rendered)))
+
+        for (k, mode, animal, _, _), future in futures:
+            try:
+                video_id = future.result()
+                if video_id:
+                    uploaded += 1
+                    print(f"✅ [{k}] {mode} {animal}: https://youtu.be/{video_id}")
+                else:
+                    print(f"❌ [{k}] {mode} {animal}: upload failed (No ID returned)")
+            except Exception:
+                print(f"❌ [{k}] PIPELINE FAILED for {mode} {animal}:")
+                traceback.print_exc()
+
+    metrics_engine.finish_run("ok" if uploaded == len(jobs) else "failed", uploaded=uploaded)
+    return uploaded
+
+def _modes_arg(flag):
+    i = sys.argv.index(flag)
+    arg = sys.argv[i + 1] if i + 1 < len(sys.argv) else ""
+    return arg.split(",") if arg and not arg.startswith("-") else None
 
 if __name__ == "__main__":
+    if "--plan" in sys.argv:
+        # --plan [short,long] = dry run: مفيش TTS ولا رندر ولا رفع
+        for mode in _modes_arg("--plan") or ["short", "long"]:
+            plan_run(mode)
+        sys.exit(0)
+    if "--enqueue" in sys.argv:
+        # --enqueue short,short,long
+        for mode in _modes_arg("--enqueue") or []:
+            jobs_engine.enqueue(mode)
+    if "--drain" in sys.argv:
+        # --drain لوحدها = كمل الطابور (أو جدول النهارده لو فاضي)، --limit N = أقصى عدد فيديوهات
+        limit = int(sys.argv[sys.argv.index("--limit") + 1]) if "--limit" in sys.argv else None
+        drain(_modes_arg("--drain"), limit=limit, prefetch="--no-prefetch" not in sys.argv)
+        sys.exit(0)
+    if "--enqueue" in sys.argv:
+        sys.exit(0)
+    if "--batch" in sys.argv:
+        # --batch لوحدها = الطابور من settings.json، أو --batch short,short,long
+        run_batch(_modes_arg("--batch") or batch_queue())
+        sys.exit(0)
+
     print("🧪 DUAL TEST MODE: Running Short THEN Long...")
     
     # نشغل الشورتس الأول
     execute_run("short")
     
     print("\n⏳ Waiting 10 seconds before Long video...")
-    import time
     time.sleep(10)
     
     # نشغل الطويل
     execute_run("long")
-    
@@ -1,52 +1,74 @@
 import os
-import requests
+import time
+import hashlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import cache_engine
+import ffmpeg_engine
+import http_engine
+import search_engine
+import metrics_engine
+import probe_engine
+
+# إعدادات التحميل
+DOWNLOAD_WORKERS = 4
+CHUNK_SIZE = 1024 * 1024          # 1 MB بدل 1 KB
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60
+MAX_RETRIES = 3
+
+def get_session():
+    """Shared keep-alive session (http_engine), pooled for the parallel downloader."""
+    return http_engine.get_session()
+
+def search_videos(query, orientation="portrait", limit=5):
+    """Search every configured stock provider (apis.stock) in parallel.
+
+    One entry per video: link + cache key + metadata, pointing at the
+    smallest rendition that still covers the render size for this
+    orientation. See search_engine for fan-out, dedup and rate limits.
+    """
+    results = search_engine.search(query, orientation=orientation, limit=limit)
+    if not results:
+        print("⚠️ No stock footage found (check PEXELS_API_KEY / PIXABAY_API_KEY)")
+    return results
 
 # التعديل المهم هنا: ضفنا limit=5
 def gather_media(query, orientation="portrait", limit=5):
-    print(f"🎥 Searching Pexels for: {query} ({orientation}) Limit: {limit}")
-    key = os.environ.get("PEXELS_API_KEY")
-    if not key: 
-        print("⚠️ No Pexels API Key found")
-        return []
-    
-    headers = {'Authorization': key}
-    url = f"https://api.pexels.com/videos/search?query={query}&per_page={limit}&orientation={orientation}"
-    
-    try:
-        r = requests.get(url, headers=headers)
-        if r.status_code != 200:
-            print(f"❌ Pexels Error: {r.text}")
-            return []
-            
-        data = r.json()
-        links = []
-        for video in data.get('videos', []):
-            files = video.get('video_files', [])
-            if files:
-                # Get best quality
-                best = sorted(files, key=lambda x: x['width'] * x['height'], reverse=True)[0]
-                links.append(best['link'])
-        return links
-    except Exception as e:
-        print(f"❌ Pexels Connection Error: {e}")
-        return []
+    return [v['link'] for v in search_videos(query, orientation=orientation, limit=limit)]
 
 def get_thumbnail_image(query, output_path="assets/temp/thumb_bg.jpg"):
     print(f"🖼️ Searching Pexels for Image: {query}")
+    alias = f"pexels_photo_query:{query.lower()}"
+    cached_key = cache_engine.resolve_alias(alias)
+    cached = cached_key and cache_engine.lookup(cached_key, ".jpg")
+    if cached:
+        print("♻️ Thumbnail Image from cache.")
+        return cache_engine.link_into(cached, output_path)
+
     key = os.environ.get("PEXELS_API_KEY")
     if not key: return None
-    
+
     headers = {'Authorization': key}
-    url = f"https://api.pexels.com/v1/search?query={query}&per_page=1&orientation=landscape"
-    
+    params = {"query": query, "per_page": 1, "orientation": "landscape"}
+
     try:
-        r = requests.get(url, headers=headers)
+        r = http_engine.get("https://api.pexels.com/v1/search", params=params, headers=headers,
+                            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
         data = r.json()
         if data.get('photos'):
-            img_url = data['photos'][0]['src']['large2x']
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            with open(output_path, 'wb') as f:
-                f.write(requests.get(img_url).content)
+            photo = data['photos'][0]
+            photo_key = cache_engine.media_key("pexels", "photo", photo.get('id'), "large2x")
+            cached = cache_engine.lookup(photo_key, ".jpg")
+            if not cached:
+                img_url = photo['src']['large2x']
+                content = http_engine.get(img_url, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), cache=False).content
+                metrics_engine.add_bytes(len(content))
+                cached = cache_engine.atomic_write(cache_engine.cache_path(photo_key, ".jpg"), content)
+            cache_engine.set_alias(alias, photo_key)
+            cache_engine.link_into(cached, output_path)
+            cache_engine.evict()
             print("✅ Thumbnail Image Downloaded.")
             return output_path
     except Exception as e:
@@ -54,14 +76,147 @@ def get_thumbnail_image(query, output_path="assets/temp/thumb_bg.jpg"):
         pass
     return None
 
-def download_video(url, filename):
+def _fetch(url, filename):
+    # Resume from a ".part" file left by a previous attempt (HTTP Range).
+    # The URL hash in the name stops us resuming another clip's bytes.
+    tag = hashlib.sha1(url.encode()).hexdigest()[:10]
+    part = f"{filename}.{tag}.part"
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+    with http_engine.stream(url, headers=headers, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)) as r:
+        if r.status_code == 416 and offset:
+            if not os.path.exists(part):
+                # الـ part اتمسح في النص: نعيد من غير Range (offset بقى 0 فمفيش loop)
+                restart = True
+            else:
+                # السيرفر بيقول الملف كامل خلاص
+                os.replace(part, filename)
+                return filename
+        else:
+            restart = False
+            r.raise_for_status()
+            if offset and r.status_code != 206:
+                # السيرفر مش بيدعم Range، نبدأ من الأول
+                offset = 0
+            with open(part, 'ab' if offset else 'wb', buffering=CHUNK_SIZE) as f:
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    if chunk:
+                        f.write(chunk)
+                        metrics_engine.add_bytes(len(chunk))
+    if restart:
+        return _fetch(url, filename)
+
+    os.replace(part, filename)
+    return filename
+
+def _fetch_head(url, filename, seconds):
+    """Download only the first seconds of a clip: ffmpeg reads the mp4 over
+    HTTP Range requests and stream-copies the video track, no re-encode."""
+    # .tmp عشان cache_engine.evict ميعدهوش entry وهو لسه بيتكتب
+    tmp = filename + ".head.tmp"
     try:
-        r = requests.get(url, stream=True)
-        with open(filename, 'wb') as f:
-            for chunk in r.iter_content(chunk_size=1024):
-                f.write(chunk)
+        result = subprocess.run(
+            [ffmpeg_engine.ffmpeg_bin(), "-y", "-hide_banner", "-loglevel", "error",
+             "-rw_timeout", str(READ_TIMEOUT * 1_000_000), "-i", url, "-t", str(seconds),
+             "-map", "0:v:0", "-c", "copy", "-movflags", "+faststart", "-f", "mp4", tmp],
+            capture_output=True, text=True, timeout=READ_TIMEOUT * 5)
+        if result.returncode != 0 or not os.path.exists(tmp):
+            raise Exception(f"partial download failed: {result.stderr[-300:]}")
+        metrics_engine.add_bytes(os.path.getsize(tmp))
+        os.replace(tmp, filename)
         return filename
-    except Exception as e:
-        print(f"❌ Download Error: {e}")
-        return None
-        
+    finally:
+        # فشل أو timeout: نص الملف ميفضلش في فولدر الكاش
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def _valid_clip(path):
+    """Probe once (probe_engine index); broken files are deleted so they get fetched again."""
+    if probe_engine.is_valid(path):
+        return True
+    print(f"🚫 Rejected bad clip {os.path.basename(path)}: {probe_engine.clip_info(path)['error']}")
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    return False
+
+def download_video(url, filename, retries=MAX_RETRIES, cache_key=None, trim=None):
+    """Download url to filename (through the cache when cache_key is given).
+
+    trim (seconds) means the edit only uses the start of the clip, so only
+    that much is fetched when ffmpeg is available.
+    """
+    # لو الكليب موجود في الكاش مش هنلمس النت خالص
+    if cache_key:
+        cached = cache_engine.lookup(cache_key)
+        if cached and _valid_clip(cached):
+            print(f"♻️ Cache hit: {cache_key}")
+            return cache_engine.link_into(cached, filename)
+
+    if trim and ffmpeg_engine.ffmpeg_bin():
+        head_key = f"{cache_key}_head{int(trim)}s" if cache_key else None
+        cached = head_key and cache_engine.lookup(head_key)
+        if cached and _valid_clip(cached):
+            print(f"♻️ Cache hit: {head_key}")
+            return cache_engine.link_into(cached, filename)
+        target = cache_engine.cache_path(head_key) if head_key else filename
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        try:
+            path = _fetch_head(url, target, trim)
+            if not _valid_clip(path):
+                raise Exception("Partial download is not a playable clip")
+            if head_key:
+                cache_engine.link_into(path, filename)
+                cache_engine.evict()
+                return filename
+            return path
+        except Exception as e:
+            print(f"⚠️ {e}, downloading the whole clip")
+
+    target = cache_engine.cache_path(cache_key) if cache_key else filename
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+    for attempt in range(1, retries + 1):
+        try:
+            path = _fetch(url, target)
+            if not _valid_clip(path):
+                raise Exception("Downloaded file is not a playable clip")
+            if cache_key:
+                cache_engine.link_into(path, filename)
+                cache_engine.evict()
+                return filename
+            return path
+        except Exception as e:
+            print(f"❌ Download Error (attempt {attempt}/{retries}): {e}")
+            if attempt < retries:
+                time.sleep(2 ** attempt)
+    return None
+
+def download_videos(urls, out_dir="assets/temp", workers=DOWNLOAD_WORKERS, keys=None, trims=None):
+    """Download clips in parallel; yields (index, path) as each one finishes.
+
+    Failed downloads yield (index, None) so callers can keep the original
+    clip order without waiting on the slowest transfer. keys, when given,
+    are the cache keys from search_videos() so repeats skip the network;
+    trims are the per-clip windows from planner_engine.plan_clips().
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    keys = keys or [None] * len(urls)
+    trims = trims or [None] * len(urls)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(metrics_engine.in_stage(download_video), url, os.path.join(out_dir, f"clip_{i}.mp4"),
+                        cache_key=keys[i], trim=trims[i]): i
+            for i, url in enumerate(urls)
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                path = future.result()
+            except Exception as e:
+                print(f"❌ Download Error: {e}")
+                path = None
+            if path:
+                print(f"⬇️ Clip {i} ready: {path}")
+            yield i, path
@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import resource
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# تقرير لكل رن: وقت كل مرحلة والذاكرة والباقي
+REPORT_PATH = os.environ.get("RUN_REPORT_PATH", "logs/run_report.jsonl")
+# كل قد إيه بناخد عينة RSS جوه المرحلة (ffmpeg بيخلص قبل آخر المرحلة، فعينة واحدة في الآخر مش كفاية)
+RSS_SAMPLE_S = float(os.environ.get("RSS_SAMPLE_S", "0.1"))
+
+_lock = threading.Lock()
+_counters = {"bytes_downloaded": 0, "frames_rendered": 0}
+_run = None
+# المرحلة اللي الكود ده شغال جواها: المراحل بتشتغل مع بعض، فالعدادات بتتحسب لصاحبها مش بالفرق
+_current = contextvars.ContextVar("metrics_stage", default=None)
+_active = []   # المراحل اللي شغالة دلوقتي
+
+def _add(counter, n):
+    with _lock:
+        _counters[counter] += n
+        own = _current.get()
+        if own is not None:
+            own[counter] += n
+
+def add_bytes(n):
+    _add("bytes_downloaded", n)
+
+def add_frames(n):
+    _add("frames_rendered", n)
+
+def in_stage(fn):
+    """Wrap fn so it counts towards the calling stage when it runs on another thread
+    (thread pools don't carry the stage over by themselves)."""
+    own = _current.get()
+    def call(*args, **kwargs):
+        token = _current.set(own)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return call
+
+def peak_rss_mb():
+    """Highest RSS since the process started (not per stage), of this process or its largest child."""
+    # ru_maxrss بالكيلوبايت على لينكس، وبتشمل ffmpeg subprocesses في CHILDREN
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / 1024, 1)
+
+def current_rss_mb():
+    """Resident memory right now of this process plus its child processes (ffmpeg readers)."""
+    pids = [str(os.getpid())]
+    try:
+        for task in os.listdir("/proc/self/task"):
+            with open(f"/proc/self/task/{task}/children") as f:
+                pids += f.read().split()
+        pages = 0
+        for pid in pids:
+            try:
+                with open(f"/proc/{pid}/statm") as f:
+                    pages += int(f.read().split()[1])
+            except (OSError, IndexError, ValueError):
+                continue  # process خلص خلاص
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except OSError:
+        return peak_rss_mb()  # مش لينكس
+
+def _cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+def start_run(mode, **info):
+    global _run
+    _run = {
+        "mode": mode,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "info": info,
+        "stages": [],
+        "_t0": time.perf_counter(),
+    }
+    return _run
+
+def _sample_rss(own, stop):
+    """Keep the highest RSS (process + ffmpeg children) seen while the stage runs."""
+    while not stop.wait(RSS_SAMPLE_S):
+        own["peak_rss_mb"] = max(own["peak_rss_mb"], current_rss_mb())
+
+@contextmanager
+def stage(name):
+    """Time one pipeline stage: wall, CPU (incl. child processes), peak RSS sampled
+    during the stage (plus the process-lifetime peak, labelled as such), bytes, frames.
+
+    Bytes and frames are counted for the stage that reported them. Process
+    CPU time is only measurable process-wide, so cpu_s is None for stages
+    that overlapped another one (overlapped: true); thread_cpu_s is always
+    the CPU of the stage's own thread. RSS is whole-process, so overlapping
+    stages share each other's memory in their peaks.
+    """
+    own = {"bytes_downloaded": 0, "frames_rendered": 0, "overlapped": False,
+           "peak_rss_mb": current_rss_mb()}
+    with _lock:
+        if _active:
+            own["overlapped"] = True
+            for other in _active:
+                other["overlapped"] = True
+        _active.append(own)
+    token = _current.set(own)
+    stop = threading.Event()
+    sampler = threading.Thread(target=_sample_rss, args=(own, stop), daemon=True)
+    sampler.start()
+    wall0, cpu0, thread0 = time.perf_counter(), _cpu_seconds(), time.thread_time()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "failed"
+        raise
+    finally:
+        _current.reset(token)
+        cpu = _cpu_seconds() - cpu0
+        thread_cpu = time.thread_time() - thread0
+        stop.set()
+        sampler.join()
+        with _lock:
+            _active.remove(own)
+        record = {
+            "stage": name,
+            "status": status,
+            "wall_s": round(time.perf_counter() - wall0, 3),
+            "cpu_s": None if own["overlapped"] else round(cpu, 3),
+            "thread_cpu_s": round(thread_cpu, 3),
+            "peak_rss_mb": max(own["peak_rss_mb"], current_rss_mb()),
+            "process_peak_rss_mb": peak_rss_mb(),
+            "bytes_downloaded": own["bytes_downloaded"],
+            "frames_rendered": own["frames_rendered"],
+            "overlapped": own["overlapped"],
+        }
+        if _run is not None:
+            with _lock:
+                _run["stages"].append(record)
+
+def finish_run(status="ok", **info):
+    """Append the run to the JSON-lines report and print a summary table."""
+    global _run
+    if _run is None:
+        return None
+    run, _run = _run, None
+    run["info"].update(info)
+    run["status"] = status
+    run["total_wall_s"] = round(time.perf_counter() - run.pop("_t0"), 3)
+    run["peak_rss_mb"] = peak_rss_mb()
+
+    try:
+        os.makedirs(os.path.dirname(REPORT_PATH) or ".", exist_ok=True)
+        with open(REPORT_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(run) + "\n")
+    except Exception as e:
+        print(f"⚠️ Could not write run report: {e}")
+
+    print_summary(run)
+    return run
+
+def print_summary(run):
+    print(f"\n📊 RUN SUMMARY ({run['mode']}, {run['status']}) - {run['total_wall_s']:.1f}s total")
+    print(f"{'stage':<14}{'wall s':>9}{'cpu s':>9}{'thr s':>9}{'rss MB':>9}{'MB down':>10}{'frames':>9}  status")
+    for s in run["stages"]:
+        cpu = f"{s['cpu_s']:>9.2f}" if s["cpu_s"] is not None else f"{'-':>9}"
+        print(f"{s['stage']:<14}{s['wall_s']:>9.2f}{cpu}{s['thread_cpu_s']:>9.2f}{s['peak_rss_mb']:>9.1f}"
+              f"{s['bytes_downloaded'] / 1e6:>10.1f}{s['frames_rendered']:>9}  {s['status']}")
@@ -0,0 +1,83 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import metrics_engine
+
+class StageFailed(Exception):
+    pass
+
+def stage(fn, *deps):
+    """Declare a stage: fn is called with the results of deps as keyword arguments."""
+    return (fn, deps)
+
+def _to_run(stages, results):
+    """Stages that still have to run: not done yet, and either a final stage
+    or needed by another stage that has to run."""
+    dependents = {n: [m for m, (_, deps) in stages.items() if n in deps] for n in stages}
+    run = set()
+    changed = True
+    while changed:
+        changed = False
+        for name in stages:
+            if name in run or name in results:
+                continue
+            if not dependents[name] or any(m in run for m in dependents[name]):
+                run.add(name)
+                changed = True
+    return run
+
+def run_stages(stages, workers=4, done=None, prefix="", on_result=None):
+    """Run a dict of {name: stage(fn, *deps)} as soon as each stage's inputs are ready.
+
+    Independent stages (e.g. footage download and TTS) overlap on a thread
+    pool. done holds results of stages that already ran elsewhere (or in an
+    earlier, interrupted run); those stages are skipped, as is anything only
+    they depended on. prefix is prepended to the metrics stage names and
+    on_result(name, result) is called as each stage succeeds. Returns
+    {name: result} including done. The first failing stage stops scheduling
+    and is re-raised as StageFailed once running stages have finished.
+    """
+    results = dict(done or {})
+    for name, (_, deps) in stages.items():
+        missing = [d for d in deps if d not in stages and d not in results]
+        if missing:
+            raise ValueError(f"Stage {name} depends on unknown stage(s): {missing}")
+
+    todo = _to_run(stages, results)
+    pending = {n: st for n, st in stages.items() if n in todo}
+    running = {}
+    failure = None
+
+    def _call(name, fn, deps):
+        kwargs = {d: results[d] for d in deps}
+        with metrics_engine.stage(prefix + name):
+            result = fn(**kwargs)
+        if on_result is not None:
+            on_result(name, result)
+        return result
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            if failure is None:
+                ready = [n for n, (_, deps) in pending.items() if all(d in results for d in deps)]
+                for name in ready:
+                    fn, deps = pending.pop(name)
+                    running[pool.submit(_call, name, fn, deps)] = name
+
+            if not running:
+                if pending and failure is None:
+                    raise ValueError(f"Dependency cycle between stages: {sorted(pending)}")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    if failure is None:
+                        failure = StageFailed(f"{name}: {e}")
+                        failure.__cause__ = e
+
+    if failure is not None:
+        raise failure
+    return results
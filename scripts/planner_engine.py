@@ -0,0 +1,40 @@
+import math
+
+# بنخطط الكليبات قبل التحميل: أقل عدد يغطي الصوت، وكل كليب محتاجين منه قد إيه
+MIN_SEGMENT = 2.0
+PARTIAL_SLACK = 2.0   # ثواني زيادة في التحميل الجزئي عشان الـ keyframes
+
+def plan_clips(videos, narration_seconds, margin=1.2, min_count=2, boundaries=()):
+    """Minimal ordered clip set covering the narration, with a trim window per clip.
+
+    videos are search_videos() entries (Pexels duration metadata). Each
+    planned entry gets "trim": the seconds of the clip the edit will use
+    (from 0), or None when the whole clip is needed. margin covers the gap
+    between an estimated and the real narration length. With fact
+    boundaries, cuts land on them like the editor's own plan.
+    """
+    target = narration_seconds * margin
+    plan = []
+    start = 0.0
+    for v in videos:
+        duration = v.get('duration') or 0
+        if duration <= 0:
+            continue
+        if start >= target and len(plan) >= min_count:
+            break
+        end = min(start + duration, target)
+        if end < target:
+            snaps = [b for b in boundaries if start + MIN_SEGMENT <= b <= end]
+            if snaps:
+                end = max(snaps)
+        use = max(end - start, min(duration, MIN_SEGMENT))
+        entry = dict(v)
+        entry['trim'] = None if use + PARTIAL_SLACK >= duration else math.ceil(use + PARTIAL_SLACK)
+        plan.append(entry)
+        start += use
+    return plan
+
+def summarize(plan):
+    full = sum(1 for p in plan if p['trim'] is None)
+    seconds = sum(p['trim'] or p.get('duration') or 0 for p in plan)
+    return f"{len(plan)} clips ({full} full, {len(plan) - full} partial), ~{seconds:.0f}s of footage"
@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import threading
+import subprocess
+from contextlib import contextmanager
+
+import cache_engine
+
+# فهرس ميتاداتا الكليبات: ffprobe مرة واحدة لكل ملف، والنتيجة محفوظة بالـ fingerprint
+DB_PATH = os.environ.get("PROBE_DB_PATH", "assets/cache/probe.sqlite3")
+# نتيجة "الملف بايظ" بتتعاد بعد يوم (ffmpeg أحدث مثلًا)، النتيجة السليمة بتفضل
+NEGATIVE_TTL = 86400
+
+_memo = {}
+_memo_lock = threading.Lock()
+
+@contextmanager
+def _connect():
+    os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS clips (
+            fingerprint TEXT PRIMARY KEY,
+            info_json TEXT,
+            probed_at REAL
+        )
+    """)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+def _rate(value):
+    try:
+        num, den = value.split("/")
+        return round(float(num) / float(den), 3) if float(den) else 0.0
+    except (AttributeError, ValueError):
+        return 0.0
+
+def _rotation(stream):
+    rotate = (stream.get("tags") or {}).get("rotate")
+    if rotate is None:
+        for side in stream.get("side_data_list") or []:
+            if "rotation" in side:
+                rotate = side["rotation"]
+    try:
+        return int(float(rotate or 0)) % 360
+    except ValueError:
+        return 0
+
+def _tail_decodes(path):
+    """Decode the last second: catches truncated or half-resumed downloads ffprobe accepts.
+
+    None when the check couldn't run (no ffmpeg, timeout, crash): that says
+    nothing about the file.
+    """
+    import ffmpeg_engine  # ffmpeg_engine نفسه بيعمل import لـ probe_engine
+    ffmpeg = ffmpeg_engine.ffmpeg_bin()
+    if not ffmpeg:
+        return None
+    try:
+        return subprocess.run([ffmpeg, "-v", "error", "-sseof", "-1", "-i", path, "-map", "0:v:0", "-f", "null", "-"],
+                              capture_output=True, timeout=60).returncode == 0
+    except Exception:
+        return None
+
+def probe_file(path, check_decode=False):
+    """ffprobe one file: displayed width/height, duration, fps, codec, rotation and validity.
+
+    Returns None when validity is unknown (ffprobe missing, timed out or
+    couldn't start); "decode_checked" is False when the tail decode didn't run.
+    """
+    ffprobe = shutil.which("ffprobe")
+    if not ffprobe:
+        return None
+    info = {"width": 0, "height": 0, "duration": 0.0, "fps": 0.0, "codec": None,
+            "rotation": 0, "has_audio": False, "valid": False, "error": None, "decode_checked": False}
+    try:
+        out = subprocess.run(
+            [ffprobe, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path],
+            capture_output=True, text=True, timeout=30, check=True
+        ).stdout
+        data = json.loads(out)
+    except subprocess.CalledProcessError as e:
+        info["error"] = (e.stderr or "ffprobe failed").strip()[:200]
+        return info
+    except (ValueError, TypeError) as e:  # JSON مش مفهوم
+        info["error"] = str(e)[:200]
+        return info
+    except Exception as e:
+        # timeout أو ffprobe مقدرش يشتغل: مش حكم على الملف
+        print(f"⚠️ ffprobe could not check {os.path.basename(path)}: {e}")
+        return None
+
+    streams = data.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    info["duration"] = float(data.get("format", {}).get("duration") or 0)
+    info["has_audio"] = any(s.get("codec_type") == "audio" for s in streams)
+    if video:
+        w, h = int(video.get("width") or 0), int(video.get("height") or 0)
+        info["rotation"] = _rotation(video)
+        # موبايل متصور بالطول: المقاس اللي هيتعرض مقلوب
+        if info["rotation"] in (90, 270):
+            w, h = h, w
+        info.update(width=w, height=h, codec=video.get("codec_name"),
+                    fps=_rate(video.get("avg_frame_rate")) or _rate(video.get("r_frame_rate")))
+        if not info["duration"]:
+            info["duration"] = float(video.get("duration") or 0)
+
+    if not video:
+        info["error"] = info["error"] or "no video stream"
+    elif not (info["width"] and info["height"] and info["duration"] > 0):
+        info["error"] = "empty video stream"
+    else:
+        decodes = _tail_decodes(path) if check_decode else None
+        info["decode_checked"] = decodes is not None
+        if decodes is False:
+            info["error"] = "truncated or corrupt (tail does not decode)"
+        else:
+            info["valid"] = True
+    return info
+
+def clip_info(path):
+    """Metadata for a video file from the index, probing (and decode-checking) it only once."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _memo_lock:
+        if memo_key in _memo:
+            return _memo[memo_key]
+
+    fp = cache_engine.file_fingerprint(path)
+    with _connect() as conn:
+        row = conn.execute("SELECT info_json, probed_at FROM clips WHERE fingerprint = ?", (fp,)).fetchone()
+    info = json.loads(row[0]) if row else None
+    if info and not info["valid"] and time.time() - row[1] > NEGATIVE_TTL:
+        info = None
+    if info is None:
+        info = probe_file(path, check_decode=True)
+        if info is None:
+            return None
+        # بنحفظ بس الأحكام الأكيدة: سليم ومتشيك عليه، أو بايظ فعلًا (ffprobe/ffmpeg رجعوا error)
+        if info["decode_checked"] or not info["valid"]:
+            with _connect() as conn:
+                conn.execute("INSERT OR REPLACE INTO clips VALUES (?, ?, ?)", (fp, json.dumps(info), time.time()))
+
+    with _memo_lock:
+        _memo[memo_key] = info
+    return info
+
+def is_valid(path):
+    """False only when the index says the file is broken (True if ffprobe is missing)."""
+    info = clip_info(path)
+    return info is None or info["valid"]
@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import random
+import shutil
+import threading
+from datetime import date
+
+import cache_engine
+import config_engine
+import content_engine
+import facts_engine
+import media_engine
+import planner_engine
+import search_engine
+import voice_engine
+
+# اختيار الحيوان: استراتيجية الكاتيجوري + من غير تكرار + الأولوية للي الكاش بتاعه سخن
+CATALOG_PATH = os.path.join(os.path.dirname(config_engine.SETTINGS_PATH), "animals_list.json")
+HISTORY_PATH = os.environ.get("SUBJECT_HISTORY_PATH", "assets/cache/subject_history.json")
+RECENT_BLOCK = 10        # آخر 10 حيوانات ممنوع يتكرروا (أو تلت الكتالوج لو أصغر)
+RECENT_PENALTY_DAYS = 30 # وبعدها الوزن بيرجع تدريجي على 30 يوم
+HISTORY_KEEP = 200
+PLANS_KEEP = 7
+
+_lock = threading.Lock()
+
+def load_catalog(path=CATALOG_PATH):
+    """{animal: category} plus the strategy's category weights."""
+    with open(path) as f:
+        data = json.load(f)
+    animals = {a: cat for cat, names in data.get("categories", {}).items() for a in names}
+    strategy = data.get("strategy", "balanced")
+    weights = data.get("strategies", {}).get(strategy, {})
+    return animals, weights
+
+def _load_history():
+    try:
+        with open(HISTORY_PATH) as f:
+            history = json.load(f)
+    except (OSError, ValueError):
+        history = {}
+    # ملف قديم (أو مكتوب من tree تاني) ممكن يكون ناقصه مفتاح
+    history.setdefault("recent", [])
+    history.setdefault("plans", {})
+    return history
+
+def _save_history(history):
+    history["recent"] = history["recent"][-HISTORY_KEEP:]
+    history["plans"] = dict(sorted(history["plans"].items())[-PLANS_KEEP:])
+    cache_engine.atomic_write(HISTORY_PATH, json.dumps(history, indent=1).encode())
+
+def _record(animal, mode):
+    with _lock:
+        history = _load_history()
+        history["recent"].append({"animal": animal, "mode": mode, "at": time.time()})
+        _save_history(history)
+
+def block_size(catalog_size):
+    """How many recent subjects are blocked: RECENT_BLOCK, capped so two thirds of the catalog stay pickable."""
+    return max(1, min(RECENT_BLOCK, catalog_size // 3))
+
+def _recency(animal, recent, now, block=RECENT_BLOCK):
+    """0 for the last block subjects, then ramping back to 1 over RECENT_PENALTY_DAYS."""
+    names = [r["animal"] for r in recent]
+    if animal in names[-block:]:
+        return 0.0
+    last = max((r["at"] for r in recent if r["animal"] == animal), default=None)
+    if last is None:
+        return 1.0
+    return min(1.0, 0.2 + (now - last) / (RECENT_PENALTY_DAYS * 86400))
+
+def warmth(animal, mode):
+    """How much of a video for this animal is already cached locally (0..3).
+
+    One point each for stored facts, footage (search results + downloaded
+    clips) and narration chunks in the TTS cache. Local lookups only.
+    """
+    has_facts = facts_engine.has_facts(animal)
+    score = 1.0 if has_facts else 0.0
+
+    orientation, limit = search_engine.MODE_SEARCH[mode]
+    videos = search_engine.cached_results(animal, orientation, limit)
+    if videos:
+        clips = sum(1 for v in videos if os.path.exists(cache_engine.cache_path(v["key"])))
+        score += 0.5 + 0.5 * clips / len(videos)
+
+    if has_facts:  # من غير facts النص هيتغير أول ما تتحمل
+        score += voice_engine.cached_fraction(content_engine.narration_body(animal, mode, offline=True))
+    return score
+
+def pick(mode, exclude=(), rng=None, record=True):
+    """Choose the next subject for a mode and (unless record=False) add it to the history."""
+    rng = rng or random
+    animals, weights = load_catalog()
+    with _lock:
+        recent = _load_history()["recent"]
+    now = time.time()
+    block = block_size(len(animals))
+    candidates, scores = [], []
+    for animal, category in animals.items():
+        if animal in exclude:
+            continue
+        w = weights.get(category, 1.0) * _recency(animal, recent, now, block) * (1.0 + warmth(animal, mode))
+        if w > 0:
+            candidates.append(animal)
+            scores.append(w)
+    if not candidates:  # الكتالوج كله اتعرض مؤخرًا
+        candidates = [a for a in animals if a not in exclude] or list(animals)
+        scores = [1.0] * len(candidates)
+    selected = rng.choices(candidates, weights=scores)[0]
+    if record:
+        _record(selected, mode)
+    print(f"🎲 System Selected: {selected} ({animals.get(selected, '?')})")
+    return selected
+
+def planned(day=None):
+    """The stored plan for a day (default today), or None."""
+    with _lock:
+        return _load_history()["plans"].get(day or date.today().isoformat())
+
+def plan_day(modes, day=None):
+    """The day's subjects for the given modes, chosen once and stored with the history.
+
+    Returns [{"mode", "animal"}]; calling it again the same day returns the same plan.
+    """
+    day = day or date.today().isoformat()
+    existing = planned(day)
+    if existing:
+        return existing
+    rng = random.Random(day)
+    plan, chosen = [], []
+    for mode in modes:
+        animal = pick(mode, exclude=chosen, rng=rng)
+        chosen.append(animal)
+        plan.append({"mode": mode, "animal": animal})
+    with _lock:
+        history = _load_history()
+        history["plans"][day] = plan
+        _save_history(history)
+    print(f"🗓️ Plan for {day}: " + ", ".join(f"{p['animal']} ({p['mode']})" for p in plan))
+    return plan
+
+def prefetch(animal, mode):
+    """Warm every cache a future run of (animal, mode) reads: facts, search results,
+    the planned clips and the narration after the hook."""
+    print(f"🔥 Prefetching {animal} ({mode})...")
+    facts_engine.refresh(animal)
+    orientation, limit = search_engine.MODE_SEARCH[mode]
+    videos = search_engine.search(animal, orientation=orientation, limit=limit)
+
+    body = content_engine.narration_body(animal, mode, offline=True)
+    # نفس التقدير اللي الرن هيعمله، فالـ trims والـ head keys تطابق
+    seconds = voice_engine.estimate_duration(content_engine.expected_script(animal, mode, offline=True))
+    plan = planner_engine.plan_clips(videos, seconds + 1.0)
+    tmp_dir = os.path.join("assets/temp", f"prefetch_{mode}")
+    try:
+        list(media_engine.download_videos([v['link'] for v in plan], tmp_dir,
+                                          keys=[v['key'] for v in plan], trims=[v['trim'] for v in plan]))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    voice_engine.prefetch(body)
+    print(f"🔥 {animal} ({mode}) warmth now {warmth(animal, mode):.1f}/3")
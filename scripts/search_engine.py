@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+
+import cache_engine
+import http_engine
+import config_engine
+
+# بحث موحد: كل الـ providers في نفس الوقت، والنتيجة متدمجة ومن غير تكرار
+SEARCH_CACHE_DIR = os.environ.get("SEARCH_CACHE_DIR", "assets/cache/search")
+SEARCH_TTL = int(os.environ.get("SEARCH_CACHE_TTL", str(24 * 3600)))
+PROVIDER_TIMEOUT = 20
+
+# المقاس اللي الرندر هيطلعه لكل orientation (نفس ffmpeg_engine.TARGETS)
+TARGET_SIZES = {"landscape": (1280, 720), "portrait": (1080, 1920)}
+TARGET_FPS = 24
+# كل mode بيدور بإيه: orientation وعدد النتايج (20 للطويل عشان نغطي الـ 3 دقايق)
+MODE_SEARCH = {"short": ("portrait", 5), "long": ("landscape", 20)}
+
+def pick_rendition(files, target_w, target_h, min_fps=TARGET_FPS):
+    """Smallest mp4 rendition that still covers target_w x target_h at >= min_fps.
+
+    "Covers" means the renderer's scale-to-cover never has to upscale it.
+    If nothing is big enough, fall back to the largest file.
+    """
+    usable = [f for f in files
+              if f.get('width') and f.get('height') and f.get('link')
+              and f.get('file_type', 'video/mp4') == 'video/mp4']
+    if not usable:
+        return None
+    area = lambda f: f['width'] * f['height']
+    covering = [f for f in usable
+                if f['width'] >= target_w and f['height'] >= target_h
+                and (f.get('fps') or min_fps) >= min_fps - 1]
+    if covering:
+        return min(covering, key=area)
+    return max(usable, key=area)
+
+class TokenBucket:
+    """Per-provider request budget, corrected from the provider's rate-limit headers."""
+
+    def __init__(self, rate_per_hour, burst=5):
+        self.rate = rate_per_hour / 3600.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        with self.lock:
+            self._refill()
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def update(self, remaining, reset_in):
+        """remaining requests left in the window, reset_in seconds until it resets."""
+        with self.lock:
+            if remaining is not None and remaining <= 0 and reset_in:
+                self.blocked_until = time.monotonic() + reset_in
+            elif remaining is not None:
+                self.tokens = min(self.tokens, float(remaining))
+
+def _header_int(headers, name):
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+def _limits(r, remaining, reset_in):
+    # رد جاي من الكاش من غير request مفيهوش rate limit حقيقي
+    if getattr(r, "cache_status", None) == "fresh":
+        return {}
+    return {"remaining": remaining, "reset_in": reset_in}
+
+# --- Providers: كل واحد بيرجع entries بنفس الشكل ---
+
+def _search_pexels(query, orientation, limit):
+    key = os.environ.get("PEXELS_API_KEY")
+    if not key:
+        return None, {}
+    r = http_engine.get("https://api.pexels.com/videos/search",
+                        params={"query": query, "per_page": limit, "orientation": orientation},
+                        headers={'Authorization': key}, timeout=(10, PROVIDER_TIMEOUT))
+    if r.status_code != 200:
+        raise Exception(f"Pexels HTTP {r.status_code}: {r.text[:200]}")
+    reset_at = _header_int(r.headers, "X-Ratelimit-Reset")
+    limits = _limits(r, _header_int(r.headers, "X-Ratelimit-Remaining"),
+                     max(0, reset_at - time.time()) if reset_at else None)
+
+    target_w, target_h = TARGET_SIZES.get(orientation, TARGET_SIZES["portrait"])
+    results = []
+    for video in r.json().get('videos', []):
+        best = pick_rendition(video.get('video_files', []), target_w, target_h)
+        if best:
+            results.append(_entry("pexels", video.get('id'), best, video.get('duration')))
+    return results, limits
+
+def _search_pixabay(query, orientation, limit):
+    key = os.environ.get("PIXABAY_API_KEY")
+    if not key:
+        return None, {}
+    r = http_engine.get("https://pixabay.com/api/videos/",
+                        params={"key": key, "q": query, "per_page": max(3, min(limit, 200))},
+                        timeout=(10, PROVIDER_TIMEOUT))
+    if r.status_code != 200:
+        raise Exception(f"Pixabay HTTP {r.status_code}: {r.text[:200]}")
+    limits = _limits(r, _header_int(r.headers, "X-RateLimit-Remaining"),
+                     _header_int(r.headers, "X-RateLimit-Reset"))
+
+    target_w, target_h = TARGET_SIZES.get(orientation, TARGET_SIZES["portrait"])
+    results = []
+    for hit in r.json().get('hits', []):
+        files = [{"width": v.get('width'), "height": v.get('height'), "link": v.get('url')}
+                 for v in hit.get('videos', {}).values()]
+        best = pick_rendition(files, target_w, target_h)
+        if not best:
+            continue
+        # Pixabay مفيهاش فلتر orientation للفيديو
+        if (best['width'] >= best['height']) != (orientation == "landscape"):
+            continue
+        results.append(_entry("pixabay", hit.get('id'), best, hit.get('duration')))
+    return results, limits
+
+def _entry(provider, media_id, rendition, duration):
+    size = f"{rendition['width']}x{rendition['height']}"
+    return {
+        "provider": provider,
+        "id": media_id,
+        "link": rendition['link'],
+        "width": rendition['width'],
+        "height": rendition['height'],
+        "fps": rendition.get('fps'),
+        "duration": duration,
+        "key": cache_engine.media_key(provider, "video", media_id, size),
+    }
+
+PROVIDERS = {
+    # name: (search function, documented hourly limit)
+    "pexels": (_search_pexels, 200),
+    "pixabay": (_search_pixabay, 100 * 60),
+}
+_buckets = {name: TokenBucket(rate) for name, (_, rate) in PROVIDERS.items()}
+
+# --- TTL cache for search responses ---
+
+def _cache_file(provider, query, orientation, limit):
+    digest = hashlib.sha1(f"{provider}|{query.lower()}|{orientation}|{limit}".encode()).hexdigest()
+    return os.path.join(SEARCH_CACHE_DIR, f"{provider}_{digest}.json")
+
+def _cache_get(path):
+    try:
+        if time.time() - os.path.getmtime(path) > SEARCH_TTL:
+            return None
+        with open(path) as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+async def _search_provider(name, query, orientation, limit):
+    path = _cache_file(name, query, orientation, limit)
+    cached = _cache_get(path)
+    if cached is not None:
+        print(f"♻️ {name}: {len(cached)} results from search cache")
+        return cached
+
+    fn, _ = PROVIDERS[name]
+    bucket = _buckets[name]
+    delay = bucket.wait_time()
+    if delay > PROVIDER_TIMEOUT:
+        print(f"⏳ {name}: rate limited for {delay:.0f}s, skipping")
+        return []
+    if delay:
+        await asyncio.sleep(delay)
+
+    try:
+        results, limits = await asyncio.wait_for(
+            asyncio.to_thread(fn, query, orientation, limit), PROVIDER_TIMEOUT)
+    except Exception as e:
+        print(f"❌ {name} search failed: {e!r}")
+        return []
+    if results is None:
+        return []  # مفيش API key
+    bucket.update(limits.get("remaining"), limits.get("reset_in"))
+    cache_engine.atomic_write(path, json.dumps(results).encode())
+    return results
+
+def merge_results(result_lists, limit):
+    """Interleave providers round-robin and drop duplicates (same provider id or same file)."""
+    seen_ids, seen_links, merged = set(), set(), []
+    for rank in range(max((len(r) for r in result_lists), default=0)):
+        for results in result_lists:
+            if rank >= len(results):
+                continue
+            entry = results[rank]
+            uid = (entry['provider'], entry['id'])
+            if uid in seen_ids or entry['link'] in seen_links:
+                continue
+            seen_ids.add(uid)
+            seen_links.add(entry['link'])
+            merged.append(entry)
+    return merged[:limit]
+
+async def search_async(query, orientation="portrait", limit=5, providers=None):
+    providers = providers or configured_providers()
+    result_lists = await asyncio.gather(
+        *(_search_provider(name, query, orientation, limit) for name in providers))
+    return merge_results(list(result_lists), limit)
+
+def cached_results(query, orientation="portrait", limit=5, providers=None):
+    """Merged results from the search cache alone, or None if any provider isn't cached."""
+    providers = providers or configured_providers()
+    result_lists = [_cache_get(_cache_file(name, query, orientation, limit)) for name in providers]
+    if any(r is None for r in result_lists):
+        return None
+    return merge_results(result_lists, limit)
+
+def configured_providers():
+    names = config_engine.load_settings().get("apis", {}).get("stock", ["pexels"])
+    return [n for n in names if n in PROVIDERS]
+
+def search(query, orientation="portrait", limit=5, providers=None):
+    """Fan out to every configured stock provider at once; latency = slowest provider."""
+    providers = providers or configured_providers()
+    print(f"🎥 Searching {', '.join(providers)} for: {query} ({orientation}) Limit: {limit}")
+    return asyncio.run(search_async(query, orientation, limit, providers))
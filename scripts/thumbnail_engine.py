@@ -0,0 +1,130 @@
+import io
+import os
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+# مواصفات يوتيوب: 1280x720 وأقل من 2 MB
+THUMB_SIZE = (1280, 720)
+MAX_BYTES = 2 * 1024 * 1024
+FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+MARGIN = 50
+
+# الـ darken كـ LUT جاهز بدل lambda على كل قيمة
+_DARKEN_LUT = [int(i * 0.6) for i in range(256)] * 3
+
+# A/B candidates: لون النص ومكانه وقوة التدرج تحت النص
+VARIANTS = [
+    {"name": "a", "fill": (255, 255, 0), "stroke": (0, 0, 0), "anchor": "top", "shade": 0.35},
+    {"name": "b", "fill": (255, 255, 255), "stroke": (200, 0, 0), "anchor": "bottom", "shade": 0.5},
+    {"name": "c", "fill": (255, 140, 0), "stroke": (0, 0, 0), "anchor": "center", "shade": 0.25},
+]
+
+@lru_cache(maxsize=32)
+def load_font(size):
+    try:
+        return ImageFont.truetype(FONT_PATH, size)
+    except Exception:
+        return ImageFont.load_default()
+
+@lru_cache(maxsize=256)
+def layout_text(text, max_w, max_h, max_size=140, min_size=40):
+    """Largest font size (and word wrap) that fits text in max_w x max_h. Cached."""
+    measure = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+    words = text.split()
+    for size in range(max_size, min_size - 1, -6):
+        font = load_font(size)
+        lines, line = [], ""
+        for word in words:
+            candidate = f"{line} {word}".strip()
+            if measure.textlength(candidate, font=font) <= max_w or not line:
+                line = candidate
+            else:
+                lines.append(line)
+                line = word
+        if line:
+            lines.append(line)
+        height = len(lines) * int(size * 1.15)
+        widest = max(measure.textlength(l, font=font) for l in lines) if lines else 0
+        if height <= max_h and widest <= max_w:
+            return size, tuple(lines)
+    return min_size, (text,)
+
+def _prepare_background(image_path):
+    img = Image.open(image_path).convert("RGB")
+    img = ImageOps.fit(img, THUMB_SIZE, Image.LANCZOS)
+    return img.point(_DARKEN_LUT)  # Darken for text
+
+def _shade(img, anchor, strength):
+    """Vertical gradient towards the text edge, applied to all pixels at once with NumPy."""
+    h = img.height
+    ramp = np.linspace(0.0, 1.0, h, dtype=np.float32)
+    if anchor == "top":
+        ramp = ramp[::-1]
+    elif anchor == "center":
+        ramp = 1.0 - np.abs(ramp - 0.5) * 2
+    factor = 1.0 - strength * ramp
+    arr = np.asarray(img, dtype=np.float32) * factor[:, None, None]
+    return Image.fromarray(arr.clip(0, 255).astype(np.uint8))
+
+def _draw_text(img, text, variant):
+    max_w = img.width - 2 * MARGIN
+    max_h = img.height // 2 - MARGIN
+    size, lines = layout_text(text, max_w, max_h)
+    font = load_font(size)
+    line_h = int(size * 1.15)
+    block_h = line_h * len(lines)
+
+    if variant["anchor"] == "top":
+        y = MARGIN
+    elif variant["anchor"] == "bottom":
+        y = img.height - MARGIN - block_h
+    else:
+        y = (img.height - block_h) // 2
+
+    draw = ImageDraw.Draw(img)
+    for line in lines:
+        draw.text((MARGIN, y), line, font=font, fill=variant["fill"],
+                  stroke_width=max(2, size // 20), stroke_fill=variant["stroke"])
+        y += line_h
+    return img
+
+def _save_under_limit(img, output_path, max_bytes=MAX_BYTES):
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    for quality in (92, 85, 78, 70, 60):
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=quality, optimize=True)
+        if buf.tell() <= max_bytes:
+            break
+    with open(output_path, "wb") as f:
+        f.write(buf.getvalue())
+    return output_path
+
+def render_thumbnail(image_path, text, output_path, variant=None, background=None):
+    variant = variant or VARIANTS[0]
+    img = background.copy() if background is not None else _prepare_background(image_path)
+    img = _shade(img, variant["anchor"], variant["shade"])
+    img = _draw_text(img, text, variant)
+    return _save_under_limit(img, output_path)
+
+def create_thumbnails(jobs, variants=2, out_dir="assets/temp/thumbs", workers=4):
+    """Batch: jobs is a list of (image_path, text, name); returns {name: [paths of A/B variants]}.
+
+    Each background is decoded, cropped and darkened once and shared by its variants.
+    """
+    chosen = VARIANTS[:max(1, variants)]
+
+    def _one(job):
+        image_path, text, name = job
+        try:
+            background = _prepare_background(image_path)
+            return name, [render_thumbnail(image_path, text, os.path.join(out_dir, f"{name}_{v['name']}.jpg"),
+                                           variant=v, background=background) for v in chosen]
+        except Exception as e:
+            print(f"⚠️ Thumbnail Failed for {name}: {e}")
+            return name, []
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(pool.map(_one, jobs))
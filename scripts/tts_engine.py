@@ -0,0 +1,308 @@
+import os
+import json
+import time
+import atexit
+import asyncio
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import cache_engine
+import config_engine
+import ffmpeg_engine
+import http_engine
+import probe_engine
+
+# الـ TTS providers: كل واحد بيتقاس (latency + errors)، والأسرع السليم بيبدأ، والتاني بيلحقه لو اتأخر
+STATS_PATH = os.environ.get("TTS_STATS_PATH", "assets/cache/tts_stats.json")
+STATS_WINDOW = 50          # آخر 50 محاولة لكل provider
+HEALTH_WINDOW = 10
+MAX_ERROR_RATE = 0.5
+COOLDOWN = 600             # provider بايظ بيتساب 10 دقايق قبل ما نجربه تاني
+MIN_SAMPLES = 3
+DEFAULT_SPEED = 1.0        # ثواني لكل 100 حرف لحد ما يبقى عندنا قياسات
+HEDGE_MIN_DELAY = 1.5
+
+EDGE_VOICE = "en-US-ChristopherNeural"
+EDGE_RATE = "+0%"
+# edge-tts بيرجع audio-24khz-48kbitrate-mono-mp3: المدة = bytes * 8 / 48000
+EDGE_BITRATE = 48000
+TICKS_PER_SECOND = 10_000_000   # offsets في WordBoundary بوحدات 100ns
+ELEVEN_VOICE_ID = "pNInz6obpgDQGcFmaJgB"  # Adam
+OPENAI_VOICE = "onyx"
+
+# --- Providers: كل واحد بيكتب mp3 في tmp_path وبيرجع timing بنفس شكل الـ sidecar ---
+
+def _even_timing(text, duration):
+    """Word timings spread by word length, for providers without word boundaries."""
+    words = text.replace("...", " ").split()
+    total = sum(len(w) for w in words) or 1
+    starts, ends, t = [], [], 0.0
+    for w in words:
+        starts.append(round(t, 3))
+        t += duration * len(w) / total
+        ends.append(round(t, 3))
+    return {"duration": duration, "words": words, "word_start": starts, "word_end": ends}
+
+def _mp3_seconds(path, bitrate):
+    info = probe_engine.probe_file(path)
+    if info and info["duration"]:
+        return info["duration"]
+    return os.path.getsize(path) * 8 / bitrate
+
+async def _edge(text, tmp_path):
+    import edge_tts  # أول chunk بس هو اللي بيدفع تمن الـ import
+    try:
+        communicate = edge_tts.Communicate(text, EDGE_VOICE, rate=EDGE_RATE, boundary="WordBoundary")
+    except TypeError:
+        # نسخ edge-tts القديمة بتبعت WordBoundary على طول ومفيهاش boundary=
+        communicate = edge_tts.Communicate(text, EDGE_VOICE, rate=EDGE_RATE)
+    words, starts, ends = [], [], []
+    size = 0
+    with open(tmp_path, "wb") as f:
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                f.write(chunk["data"])
+                size += len(chunk["data"])
+            elif chunk["type"] == "WordBoundary":
+                words.append(chunk["text"])
+                starts.append(chunk["offset"] / TICKS_PER_SECOND)
+                ends.append((chunk["offset"] + chunk["duration"]) / TICKS_PER_SECOND)
+    if not size:
+        raise Exception("edge-tts returned no audio")
+    return {"duration": size * 8 / EDGE_BITRATE, "words": words, "word_start": starts, "word_end": ends}
+
+def _elevenlabs(text, tmp_path):
+    r = http_engine.post(f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVEN_VOICE_ID}",
+                         headers={"xi-api-key": os.environ["ELEVENLABS_API_KEY"]},
+                         json={"text": text, "model_id": "eleven_monolingual_v1",
+                               "voice_settings": {"stability": 0.5, "similarity_boost": 0.75}},
+                         timeout=(10, _timeout()))
+    if r.status_code != 200:
+        raise Exception(f"ElevenLabs HTTP {r.status_code}: {r.text[:200]}")
+    with open(tmp_path, "wb") as f:
+        f.write(r.content)
+    return _even_timing(text, _mp3_seconds(tmp_path, 128000))
+
+def _openai(text, tmp_path):
+    r = http_engine.post("https://api.openai.com/v1/audio/speech",
+                         headers={"Authorization": f"Bearer {os.environ['OPENAI_API_KEY']}"},
+                         json={"model": "tts-1", "voice": OPENAI_VOICE, "input": text, "response_format": "mp3"},
+                         timeout=(10, _timeout()))
+    if r.status_code != 200:
+        raise Exception(f"OpenAI HTTP {r.status_code}: {r.text[:200]}")
+    with open(tmp_path, "wb") as f:
+        f.write(r.content)
+    return _even_timing(text, _mp3_seconds(tmp_path, 160000))
+
+def _local(text, tmp_path):
+    """Offline stand-in: silence as long as the text would take to read. For tests and benchmarks."""
+    ffmpeg = ffmpeg_engine.ffmpeg_bin()
+    if not ffmpeg:
+        raise Exception("local TTS needs ffmpeg")
+    duration = max(0.5, len(text.split()) / 2.6)
+    subprocess.run([ffmpeg, "-y", "-hide_banner", "-loglevel", "error", "-f", "lavfi",
+                    "-i", "anullsrc=r=24000:cl=mono", "-t", f"{duration:.3f}",
+                    "-c:a", "libmp3lame", "-b:a", "48k", "-f", "mp3", tmp_path], check=True)
+    return _even_timing(text, duration)
+
+PROVIDERS = {
+    # name: (synthesize function, voice (part of the cache key), env var it needs)
+    "edge": (_edge, EDGE_VOICE, None),
+    "elevenlabs": (_elevenlabs, ELEVEN_VOICE_ID, "ELEVENLABS_API_KEY"),
+    "openai": (_openai, OPENAI_VOICE, "OPENAI_API_KEY"),
+    "local": (_local, "local-silence", None),
+}
+
+def _settings():
+    return config_engine.load_settings().get("tts", {})
+
+def _timeout():
+    return float(_settings().get("timeout", 45))
+
+def configured_providers():
+    """Providers from TTS_PROVIDERS or settings apis.tts that are usable here, in preference order."""
+    names = os.environ.get("TTS_PROVIDERS")
+    names = names.split(",") if names else config_engine.load_settings().get("apis", {}).get("tts", ["edge"])
+    usable = []
+    for name in names:
+        name = name.strip()
+        if name in PROVIDERS and (PROVIDERS[name][2] is None or os.environ.get(PROVIDERS[name][2])):
+            usable.append(name)
+    return usable or ["edge"]
+
+# --- Rolling stats ---
+
+_stats_lock = threading.Lock()
+_stats = None
+
+def _load_stats():
+    global _stats
+    if _stats is None:
+        try:
+            with open(STATS_PATH) as f:
+                _stats = json.load(f)
+        except (OSError, ValueError):
+            _stats = {}
+    return _stats
+
+def save_stats():
+    with _stats_lock:
+        data = json.dumps(_load_stats()).encode()
+    cache_engine.atomic_write(STATS_PATH, data)
+
+@atexit.register
+def _save_late_samples():
+    # الـ requests اللي خسرت الـ hedge بتسجل بعد save_stats بتاع الـ run
+    if _stats is not None:
+        save_stats()
+
+def record(name, seconds, chars, ok):
+    """One attempt: latency normalised to seconds per 100 characters, and whether it worked."""
+    with _stats_lock:
+        samples = _load_stats().setdefault(name, [])
+        samples.append([round(seconds * 100 / max(chars, 1), 4), ok, time.time()])
+        del samples[:-STATS_WINDOW]
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else None
+
+def summary(name):
+    with _stats_lock:
+        samples = list(_load_stats().get(name, []))
+    recent = samples[-HEALTH_WINDOW:]
+    errors = sum(1 for _, ok, _ in recent if not ok)
+    speeds = [s for s, ok, _ in samples if ok]
+    last_error = max((t for _, ok, t in samples if not ok), default=0)
+    error_rate = errors / len(recent) if recent else 0.0
+    return {
+        "samples": len(samples),
+        "error_rate": round(error_rate, 2),
+        "p50": _percentile(speeds, 0.5),
+        "p90": _percentile(speeds, 0.9),
+        "healthy": error_rate < MAX_ERROR_RATE or time.time() - last_error > COOLDOWN,
+    }
+
+def ranked(names=None):
+    """Configured providers (or names), healthy first, then fastest median (list order breaks ties)."""
+    names = names or configured_providers()
+    def key(item):
+        i, name = item
+        s = summary(name)
+        speed = s["p50"] if s["samples"] >= MIN_SAMPLES and s["p50"] is not None else DEFAULT_SPEED
+        return (not s["healthy"], speed, i)
+    return [name for _, name in sorted(enumerate(names), key=key)]
+
+def majority(used, names=None):
+    """The provider that voiced most of a narration's chunks (best-ranked wins a tie)."""
+    order = ranked(names)
+    counts = {}
+    for provider in used:
+        counts[provider] = counts.get(provider, 0) + 1
+    return max(counts, key=lambda p: (counts[p], -order.index(p) if p in order else -len(order)))
+
+def hedge_delay(name, text):
+    """Seconds to wait on a provider before firing the next one: its latency percentile for this length."""
+    q = float(_settings().get("hedge_percentile", 0.9))
+    with _stats_lock:
+        speeds = [s for s, ok, _ in _load_stats().get(name, []) if ok]
+    speed = _percentile(speeds, q) if len(speeds) >= MIN_SAMPLES else DEFAULT_SPEED * 3
+    return max(HEDGE_MIN_DELAY, speed * len(text) / 100)
+
+# --- Hedged synthesis ---
+
+# الـ providers اللي sync بيشتغلوا هنا مش في الـ default executor: asyncio.run مبيستناش
+# الـ request اللي خسر السباق يخلص
+_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tts")
+
+def _discard(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def _run_sync(name, fn, text, tmp):
+    """Thread side of a sync provider. It runs to the end even after losing a hedge,
+    so its real latency is recorded (slower than the timeout counts as a failure)."""
+    started = time.perf_counter()
+    try:
+        timing = fn(text, tmp)
+    except BaseException:
+        record(name, time.perf_counter() - started, len(text), False)
+        _discard(tmp)
+        raise
+    seconds = time.perf_counter() - started
+    record(name, seconds, len(text), seconds <= _timeout())
+    return timing
+
+async def _attempt(name, text, path):
+    fn = PROVIDERS[name][0]
+    tmp = f"{path}.{name}.tmp"
+    if not asyncio.iscoroutinefunction(fn):
+        future = _pool.submit(_run_sync, name, fn, text, tmp)
+        try:
+            timing = await asyncio.wait_for(asyncio.wrap_future(future), _timeout())
+        except BaseException:
+            # خسر السباق أو عدى الـ timeout: الـ thread لسه بيكتب، فالـ tmp يتمسح لما يخلص
+            future.add_done_callback(lambda _: _discard(tmp))
+            raise
+    else:
+        started = time.perf_counter()
+        try:
+            timing = await asyncio.wait_for(fn(text, tmp), _timeout())
+        except asyncio.CancelledError:
+            # خسر السباق: الوقت اتقطع في النص فمش عينة latency
+            _discard(tmp)
+            raise
+        except BaseException:
+            record(name, time.perf_counter() - started, len(text), False)
+            _discard(tmp)
+            raise
+        record(name, time.perf_counter() - started, len(text), True)
+    timing["provider"] = name
+    return name, tmp, timing
+
+async def synthesize(text, path_for, providers=None):
+    """Narrate one chunk with the best provider, hedging to the next one when the
+    first is slower than its latency percentile and failing over on errors.
+
+    path_for(provider) is the chunk's final cache path for that provider;
+    providers overrides the ranked order (one name = no hedging).
+    Returns (provider, tmp_path, timing); the caller moves tmp_path into place.
+    """
+    order = list(providers or ranked())
+    hedge = bool(_settings().get("hedge", True))
+    tasks = {}
+    backups = iter(order)
+    errors = []
+
+    def launch():
+        name = next(backups, None)
+        if name:
+            tasks[asyncio.ensure_future(_attempt(name, text, path_for(name)))] = name
+        return name
+
+    launch()
+    hedge_at = hedge_delay(order[0], text) if hedge and len(order) > 1 else None
+    try:
+        while tasks:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_at, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                name = launch()
+                if name:
+                    print(f"⏱️ {tasks[next(iter(tasks))]} is slow, hedging with {name}")
+                hedge_at = None
+                continue
+            for task in done:
+                name = tasks.pop(task)
+                if task.exception() is None:
+                    return task.result()
+                errors.append(f"{name}: {task.exception()!r}")
+                # failover: اللي بعده يبدأ على طول
+                if not tasks and launch():
+                    print(f"↪️ TTS failover after {name} failed")
+    finally:
+        for task in tasks:
+            task.cancel()
+    raise Exception("All TTS providers failed: " + "; ".join(errors))
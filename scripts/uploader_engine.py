@@ -1,52 +1,203 @@
 import os
 import sys
-import google_auth_oauthlib.flow
-import googleapiclient.discovery
-import googleapiclient.errors
-from google.oauth2.credentials import Credentials
+import json
+import time
+import random
+import threading
+
+# مكتبات جوجل تقيلة، فبتتحمل جوه الدوال أول ما نرفع فعلًا
+
+_youtube = None
+_youtube_lock = threading.Lock()
+
+def get_youtube_client():
+    """Build the YouTube API client once per process and reuse it (batch runs)."""
+    global _youtube
+    import googleapiclient.discovery
+    from google.oauth2.credentials import Credentials
+    with _youtube_lock:
+        if _youtube is None:
+            token_info = {
+                "client_id": os.environ.get("YOUTUBE_CLIENT_ID"),
+                "client_secret": os.environ.get("YOUTUBE_CLIENT_SECRET"),
+                "refresh_token": os.environ.get("YOUTUBE_REFRESH_TOKEN"),
+                "token_uri": "https://oauth2.googleapis.com/token"
+            }
+            creds = Credentials.from_authorized_user_info(token_info)
+            _youtube = googleapiclient.discovery.build("youtube", "v3", credentials=creds)
+        return _youtube
+
+# --- Resumable upload ---
+CHUNK_SIZE = 8 * 1024 * 1024          # لازم يكون مضاعف 256 KB
+MAX_RETRIES = 8
+RETRIABLE_STATUS = (500, 502, 503, 504)
+SESSIONS_PATH = os.environ.get("UPLOAD_SESSIONS_PATH", "assets/cache/upload_sessions.json")
+SESSION_TTL = 7 * 86400               # يوتيوب بيلغي الـ upload sessions بعد أسبوع تقريبًا
+_sessions_lock = threading.Lock()
+
+def _session_key(file_path):
+    st = os.stat(file_path)
+    return f"{os.path.abspath(file_path)}|{st.st_size}|{int(st.st_mtime)}"
+
+def _load_sessions():
+    try:
+        with open(SESSIONS_PATH) as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def _save_session(key, **fields):
+    """Persist the upload session (URI / finished video id) so a crashed run can resume.
+    No fields = forget the entry."""
+    with _sessions_lock:
+        sessions = _load_sessions()
+        if fields:
+            sessions.setdefault(key, {}).update(fields, saved_at=time.time())
+        else:
+            sessions.pop(key, None)
+        now = time.time()
+        sessions = {k: v for k, v in sessions.items() if now - v.get("saved_at", now) < SESSION_TTL}
+        os.makedirs(os.path.dirname(SESSIONS_PATH) or ".", exist_ok=True)
+        tmp = SESSIONS_PATH + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(sessions, f, indent=2)
+        os.replace(tmp, SESSIONS_PATH)
+
+def _resume_session(request, uri, size):
+    """Point request at a saved session, starting from the last byte the server has.
+
+    Uses the resumable protocol's status query (empty PUT with
+    Content-Range: bytes */size) through the request's own authorized http,
+    and only the public resumable_uri / resumable_progress attributes.
+    Returns the API response if that upload had already finished, else None.
+    """
+    import googleapiclient.errors
+    resp, content = request.http.request(uri, "PUT", headers={"Content-Range": f"bytes */{size}",
+                                                              "Content-Length": "0"})
+    if resp.status in (200, 201):
+        return json.loads(content)
+    if resp.status != 308:
+        raise googleapiclient.errors.HttpError(resp, content, uri=uri)
+    # Range: bytes=0-12345 = آخر byte وصل
+    received = resp.get("range")
+    request.resumable_uri = uri
+    request.resumable_progress = int(received.rsplit("-", 1)[1]) + 1 if received else 0
+    return None
+
+def _send_chunks(request, file_path, key):
+    """Drive a resumable upload chunk by chunk with exponential backoff. Returns the API response."""
+    import httplib2
+    import googleapiclient.errors
+    size = os.path.getsize(file_path)
+    saved = _load_sessions().get(key, {}).get("uri")
+    response = None
+    if saved:
+        # نكمل من آخر byte وصل للسيرفر
+        print("♻️ Resuming previous upload session...")
+        try:
+            response = _resume_session(request, saved, size)
+        except googleapiclient.errors.HttpError as e:
+            if e.resp.status not in (404, 410):
+                raise
+            print("⚠️ Upload session expired, starting over")
+            _save_session(key, uri=None)
+            saved = None
+
+    retries = 0
+    started = time.time()
+    start_bytes = None
+    while response is None:
+        try:
+            status, response = request.next_chunk()
+            retries = 0
+            if request.resumable_uri and request.resumable_uri != saved:
+                saved = request.resumable_uri
+                _save_session(key, uri=saved)
+            if status:
+                if start_bytes is None:
+                    start_bytes = status.resumable_progress
+                sent = status.resumable_progress - start_bytes
+                rate = sent / max(time.time() - started, 1e-6) / 1e6
+                print(f"📤 {status.progress() * 100:5.1f}% of {size / 1e6:.0f} MB ({rate:.1f} MB/s)")
+        except googleapiclient.errors.HttpError as e:
+            code = e.resp.status
+            if code in (404, 410) and saved:
+                # الـ session انتهت، نبدأ من الأول (next_chunk بيفتح session جديدة لما الـ URI يبقى None)
+                print("⚠️ Upload session expired, starting over")
+                _save_session(key, uri=None)
+                request.resumable_uri = None
+                request.resumable_progress = 0
+                saved = None
+                continue
+            if code not in RETRIABLE_STATUS:
+                raise
+            retries = _backoff(retries, e)
+        except (ConnectionError, TimeoutError, OSError, httplib2.HttpLib2Error) as e:
+            retries = _backoff(retries, e)
+
+    elapsed = time.time() - started
+    print(f"📈 Upload throughput: {size / 1e6 / max(elapsed, 1e-6):.1f} MB/s over {elapsed:.0f}s")
+    return response
+
+def _backoff(retries, error):
+    retries += 1
+    if retries > MAX_RETRIES:
+        raise error
+    delay = min(2 ** retries, 64) + random.random()
+    print(f"⚠️ Upload hiccup ({error}), retry {retries}/{MAX_RETRIES} in {delay:.0f}s")
+    time.sleep(delay)
+    return retries
+
+def forget_upload(file_path):
+    """Drop a finished upload's saved session once the caller has recorded the video id."""
+    try:
+        _save_session(_session_key(file_path))
+    except OSError:
+        pass  # الملف اتمسح: الـ entry هتخلص بالـ SESSION_TTL
 
 # التعديل هنا: خلينا الدالة تقبل tags و thumbnail_path
 def upload_video(file_path, title, description, tags=[], thumbnail_path=None):
-    print("🚀 Uploading to YouTube (STRICT MODE + THUMBNAIL)...")
-    
+    print("🚀 Uploading to YouTube (RESUMABLE + THUMBNAIL)...")
+
     if not os.environ.get("YOUTUBE_REFRESH_TOKEN"):
         print("❌ Error: YOUTUBE_REFRESH_TOKEN is missing!")
-        sys.exit(1)
-
-    token_info = {
-        "client_id": os.environ.get("YOUTUBE_CLIENT_ID"),
-        "client_secret": os.environ.get("YOUTUBE_CLIENT_SECRET"),
-        "refresh_token": os.environ.get("YOUTUBE_REFRESH_TOKEN"),
-        "token_uri": "https://oauth2.googleapis.com/token"
-    }
+        return None
 
     try:
-        creds = Credentials.from_authorized_user_info(token_info)
-        youtube = googleapiclient.discovery.build("youtube", "v3", credentials=creds)
-
-        body = {
-            "snippet": {
-                "title": title,
-                "description": description,
-                "tags": tags, # بنضيف التاجز هنا
-                "categoryId": "15"
-            },
-            "status": {
-                "privacyStatus": "public",
-                "selfDeclaredMadeForKids": False
+        import googleapiclient.http
+        youtube = get_youtube_client()
+        key = _session_key(file_path)
+
+        video_id = _load_sessions().get(key, {}).get("video_id")
+        if video_id:
+            print(f"♻️ Already uploaded in a previous run: {video_id}")
+        else:
+            body = {
+                "snippet": {
+                    "title": title,
+                    "description": description,
+                    "tags": tags, # بنضيف التاجز هنا
+                    "categoryId": "15"
+                },
+                "status": {
+                    "privacyStatus": "public",
+                    "selfDeclaredMadeForKids": False
+                }
             }
-        }
-
-        # 1. رفع الفيديو
-        print("📤 Sending Video File...")
-        request = youtube.videos().insert(
-            part="snippet,status",
-            body=body,
-            media_body=googleapiclient.http.MediaFileUpload(file_path)
-        )
-        response = request.execute()
-        video_id = response['id']
-        print(f"✅ VIDEO UPLOADED! ID: {video_id}")
+
+            # 1. رفع الفيديو
+            print("📤 Sending Video File...")
+            request = youtube.videos().insert(
+                part="snippet,status",
+                body=body,
+                media_body=googleapiclient.http.MediaFileUpload(
+                    file_path, mimetype="video/mp4", chunksize=CHUNK_SIZE, resumable=True
+                )
+            )
+            response = _send_chunks(request, file_path, key)
+            video_id = response['id']
+            _save_session(key, uri=None, video_id=video_id)
+            print(f"✅ VIDEO UPLOADED! ID: {video_id}")
 
         # 2. رفع الثامبنيل (لو موجود)
         if thumbnail_path and os.path.exists(thumbnail_path):
@@ -60,9 +211,10 @@ def upload_video(file_path, title, description, tags=[], thumbnail_path=None):
             except Exception as e:
                 print(f"⚠️ Thumbnail Upload Failed (Video is still safe): {e}")
 
+        # الـ video_id بيفضل محفوظ لحد ما الـ job يتسجل done (forget_upload)، فأي rerun قبلها مش هيرفع تاني
         return video_id
 
     except Exception as e:
+        # مش بنقفل البروسيس: الـ session محفوظة والرن الجاي يكمل
         print(f"❌ FATAL UPLOAD ERROR: {e}")
-        sys.exit(1)
-        
+        return None
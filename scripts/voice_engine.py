@@ -1,22 +1,201 @@
 import asyncio
-import edge_tts
+import hashlib
+import json
+import shutil
+import subprocess
 import os
 
-async def _generate_voice_async(text, output_path):
-    # Voice: Male, Deep (Christopher)
-    voice = "en-US-ChristopherNeural"
-    # Rate: Default (0%) for longer duration and clarity
-    rate = "+0%" 
-    
-    communicate = edge_tts.Communicate(text, voice, rate=rate)
-    await communicate.save(output_path)
+import ffmpeg_engine
+import tts_engine
 
-def generate_voice(text, output_path="assets/temp/voice.mp3"):
+# Voice: Male, Deep (Christopher)
+VOICE = tts_engine.EDGE_VOICE
+# Rate: Default (0%) for longer duration and clarity
+RATE = tts_engine.EDGE_RATE
+PROVIDER = "edge"
+
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", "assets/cache/tts")
+MAX_CONCURRENCY = 4
+CHUNK_RETRIES = 3
+
+def split_script(text):
+    """Split a script at the '...' pauses between facts. The pauses are kept on
+    the chunks so the narration sounds the same as one long request."""
+    parts = [p.strip() for p in text.split("...")]
+    chunks = [p + " ..." for p in parts[:-1] if p] + ([parts[-1]] if parts[-1] else [])
+    return chunks or [text]
+
+def estimate_duration(text, words_per_second=2.6, pause=0.5):
+    """Rough narration length in seconds, for planning before TTS has finished."""
+    return len(text.split()) / words_per_second + text.count("...") * pause
+
+def chunk_key(text, voice=VOICE, rate=RATE, provider=PROVIDER):
+    return hashlib.sha256(f"{provider}|{voice}|{rate}|{text}".encode()).hexdigest()
+
+def chunk_path(text, provider=PROVIDER):
+    voice = tts_engine.PROVIDERS[provider][1]
+    return os.path.join(TTS_CACHE_DIR, chunk_key(text, voice=voice, provider=provider) + ".mp3")
+
+def cached_path(text):
+    """The chunk from whichever configured provider already has it (best-ranked first), or None."""
+    for provider in tts_engine.ranked():
+        path = chunk_path(text, provider)
+        if os.path.exists(path) and os.path.exists(_sidecar(path)):
+            return path
+    return None
+
+def is_cached(text):
+    return cached_path(text) is not None
+
+def cached_fraction(text):
+    """Share of a script's chunks already in the TTS cache (0..1)."""
+    chunks = split_script(text)
+    return sum(1 for c in chunks if is_cached(c)) / len(chunks)
+
+def prefetch(text):
+    """Synthesize a script's chunks into the cache without stitching an output file."""
+    return asyncio.run(_generate_voice_async(split_script(text)))
+
+async def _synthesize_chunk(text, semaphore, providers=None):
+    """One chunk through the provider registry (hedged, with failover); audio to the
+    provider's cache path, word timings to the .json beside it."""
+    async with semaphore:
+        for attempt in range(1, CHUNK_RETRIES + 1):
+            try:
+                provider, tmp, timing = await tts_engine.synthesize(text, lambda name: chunk_path(text, name),
+                                                                    providers)
+                path = chunk_path(text, provider)
+                with open(_sidecar(path), "w") as f:
+                    json.dump(timing, f)
+                os.replace(tmp, path)
+                return path
+            except Exception as e:
+                if attempt == CHUNK_RETRIES:
+                    raise
+                print(f"⚠️ TTS chunk failed ({e}), retry {attempt}/{CHUNK_RETRIES}")
+                await asyncio.sleep(2 ** attempt)
+
+async def _generate_voice_async(chunks):
+    """Synthesize every uncached chunk concurrently; returns the chunk files in order."""
+    os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    found, jobs = {}, {}
+    for text in chunks:
+        if text in found or text in jobs:
+            continue
+        cached = cached_path(text)
+        if cached:
+            found[text] = cached
+        else:
+            jobs[text] = _synthesize_chunk(text, semaphore)
+    print(f"🎙️ {len(chunks)} chunks, {len(chunks) - len(jobs)} from cache (providers: {', '.join(tts_engine.ranked())})")
+    found.update(zip(jobs, await asyncio.gather(*jobs.values())))
+    await _one_voice(found, semaphore)
+    tts_engine.save_stats()
+    return [found[text] for text in chunks]
+
+async def _one_voice(found, semaphore):
+    """Hedging/failover can voice chunks with different providers (= different
+    speakers). Redo the odd ones with the provider that voiced most of the
+    script; only if that provider is down too does the narration stay mixed."""
+    used = {text: _provider(path) for text, path in found.items()}
+    if len(set(used.values())) < 2:
+        return
+    voice = tts_engine.majority(used.values())
+    redo = [text for text, provider in used.items() if provider != voice]
+    print(f"🎙️ Re-voicing {len(redo)} chunks with {voice} so the narration keeps one voice")
+    results = await asyncio.gather(*(_synthesize_chunk(text, semaphore, [voice]) for text in redo),
+                                   return_exceptions=True)
+    for text, result in zip(redo, results):
+        if isinstance(result, Exception):
+            print(f"⚠️ {voice} failed again ({result}), narration will mix voices")
+        elif _provider(result) == voice:
+            found[text] = result
+
+def _provider(path):
+    with open(_sidecar(path)) as f:
+        return json.load(f).get("provider", "edge")
+
+def _stitch(paths, output_path):
+    # chunks من provider واحد = نفس الفورمات، فـ concat من غير re-encode = مفيش فراغات
+    if len(paths) > 1 and ffmpeg_engine.ffmpeg_bin() and len({_provider(p) for p in paths}) > 1:
+        # آخر حل لو _one_voice معرفش يوحّد الصوت: providers مختلفة ليها sample rates مختلفة، فلازم re-encode
+        inputs = [arg for p in paths for arg in ("-i", p)]
+        graph = "".join(f"[{i}:a]" for i in range(len(paths))) + f"concat=n={len(paths)}:v=0:a=1[a]"
+        result = subprocess.run(
+            [ffmpeg_engine.ffmpeg_bin(), "-y", "-hide_banner", "-loglevel", "error", *inputs, "-filter_complex", graph,
+             "-map", "[a]", "-c:a", "libmp3lame", "-b:a", "96k", "-ar", "24000", "-ac", "1", output_path],
+            capture_output=True, text=True)
+        if result.returncode == 0:
+            return output_path
+        print(f"⚠️ ffmpeg re-encode stitch failed: {result.stderr[-500:]}")
+    if len(paths) > 1 and ffmpeg_engine.ffmpeg_bin():
+        list_path = output_path + ".txt"
+        with open(list_path, "w") as f:
+            for p in paths:
+                f.write(f"file '{os.path.abspath(p)}'\n")
+        result = subprocess.run(
+            [ffmpeg_engine.ffmpeg_bin(), "-y", "-hide_banner", "-loglevel", "error", "-f", "concat", "-safe", "0",
+             "-i", list_path, "-c", "copy", output_path],
+            capture_output=True, text=True)
+        os.remove(list_path)
+        if result.returncode == 0:
+            return output_path
+        print(f"⚠️ ffmpeg stitch failed, joining MP3 frames directly: {result.stderr[-500:]}")
+
+    with open(output_path, "wb") as out:
+        for p in paths:
+            with open(p, "rb") as f:
+                shutil.copyfileobj(f, out)
+    return output_path
+
+def _sidecar(audio_path):
+    return os.path.splitext(audio_path)[0] + ".json"
+
+def timing_path(audio_path):
+    return os.path.splitext(audio_path)[0] + ".timing.json"
+
+def build_timing(paths):
+    """Merge per-chunk word timings into one index for the stitched narration.
+
+    Each chunk is one fact (or the hook/outro), so fact_start/fact_end are the
+    chunk boundaries. Times are seconds, rounded to milliseconds.
+    """
+    index = {"duration": 0.0, "fact_start": [], "fact_end": [],
+             "words": [], "word_start": [], "word_end": []}
+    offset = 0.0
+    for path in paths:
+        with open(_sidecar(path)) as f:
+            chunk = json.load(f)
+        index["fact_start"].append(round(offset, 3))
+        index["words"] += chunk["words"]
+        index["word_start"] += [round(offset + t, 3) for t in chunk["word_start"]]
+        index["word_end"] += [round(offset + t, 3) for t in chunk["word_end"]]
+        offset += chunk["duration"]
+        index["fact_end"].append(round(offset, 3))
+    index["duration"] = round(offset, 3)
+    return index
+
+def load_timing(audio_path):
+    """Timing index saved beside a narration by generate_voice (None if there isn't one)."""
+    try:
+        with open(timing_path(audio_path)) as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+def generate_voice(text, output_path="assets/temp/voice.mp3", return_timing=False):
+    """Narrate text to output_path. Also writes <name>.timing.json beside it
+    (per-word and per-fact offsets); with return_timing=True returns (path, timing)."""
     print("🎙️ Generating Voice (Normal Speed)...")
     try:
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        asyncio.run(_generate_voice_async(text, output_path))
-        return output_path
+        paths = asyncio.run(_generate_voice_async(split_script(text)))
+        _stitch(paths, output_path)
+        timing = build_timing(paths)
+        with open(timing_path(output_path), "w") as f:
+            json.dump(timing, f)
+        return (output_path, timing) if return_timing else output_path
     except Exception as e:
         print(f"❌ TTS Error: {e}")
-        return None
+        return (None, None) if return_timing else None